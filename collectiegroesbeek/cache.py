@@ -0,0 +1,338 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import IO, Any, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+from .connection import get_client, run_concurrently
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TTLCache:
+    """Least-recently-used cache of which the entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] < self.timer():
+                del self._items[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._items[key] = (self.timer() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+class DataGeneration:
+    """Keep track of the timestamped index each alias points to.
+
+    `IndexMover` creates a new index `<alias>_<epoch>` on every ingest, so the alias to index
+    map identifies the version of the data. Caches put it in their keys, which makes them miss
+    as soon as an alias is swapped. Elasticsearch is asked at most once every `check_interval`
+    seconds. After `start_background_refresh()` the checks happen in a daemon thread instead,
+    so requests don't wait for them.
+    """
+
+    def __init__(self, check_interval: float = 30.0, timer: Callable[[], float] = time.monotonic):
+        self.check_interval = check_interval
+        self.timer = timer
+        self._alias_to_index: Dict[str, str] = {}
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._callbacks: List[Callable[[], Any]] = []
+
+    def get(self) -> Tuple[Tuple[str, str], ...]:
+        """Return the (alias, index) pairs, sorted by alias."""
+        return tuple(sorted(self.get_alias_to_index().items()))
+
+    def get_alias_to_index(self) -> Dict[str, str]:
+        with self._lock:
+            now = self.timer()
+            if self._checked_at is None or (
+                self._thread is None and now - self._checked_at > self.check_interval
+            ):
+                self._update(now)
+            return self._alias_to_index
+
+    def on_change(self, callback: Callable[[], Any]):
+        """Register a function the background thread calls when an alias has moved.
+
+        The functions are called concurrently.
+        """
+        self._callbacks.append(callback)
+
+    def start_background_refresh(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._refresh_loop, name="data-generation", daemon=True
+        )
+        self._thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                with self._lock:
+                    changed = self._update(self.timer())
+                if changed:
+                    run_concurrently(*self._callbacks)
+            except Exception:
+                logger.exception("Failed to refresh the data generation")
+            time.sleep(self.check_interval)
+
+    def _update(self, now: float) -> bool:
+        alias_to_index = self._fetch()
+        changed = alias_to_index != self._alias_to_index
+        self._alias_to_index = alias_to_index
+        self._checked_at = now
+        return changed
+
+    @staticmethod
+    def _fetch() -> Dict[str, str]:
+        es = get_client()
+        aliases: list[dict[str, str]] = es.cat.aliases(format="json")  # type: ignore
+        return {item["alias"]: item["index"] for item in aliases}
+
+
+data_generation = DataGeneration()
+
+
+class AliasSnapshot(Generic[T]):
+    """Data loaded from the index behind an alias, kept in memory until the alias moves.
+
+    Each worker loads it once. With the background refresh of the data generation it is
+    reloaded right after a new index is swapped in, before any request asks for it.
+    """
+
+    def __init__(self, alias: str, load: Callable[[], T]):
+        self.alias = alias
+        self.load = load
+        self._index: Optional[str] = None
+        self._value: Optional[T] = None
+        self._lock = threading.Lock()
+        data_generation.on_change(self.get)
+
+    def get(self) -> T:
+        index = data_generation.get_alias_to_index().get(self.alias)
+        with self._lock:
+            if self._value is None or index != self._index:
+                self._value = self.load()
+                self._index = index
+            return self._value
+
+
+def check_private_directory(path: str):
+    """Create the directory if needed, and raise a ValueError unless only this user can use it.
+
+    Other users must not be able to put files in it, so it must be a directory, not a symlink,
+    owned by this user and with mode 0700.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise ValueError(f"{path} is not a directory")
+    if info.st_uid != os.getuid():
+        raise ValueError(f"{path} belongs to another user")
+    if info.st_mode & 0o077:
+        raise ValueError(f"{path} can be used by other users, it needs mode 0700")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Let concurrent calls with the same key wait for one of them and share its result.
+
+    Within a process the first call runs the function and the others wait for it. With a
+    `path`, the processes also coordinate through files in that directory: the process that
+    runs the function holds an exclusive lock on `<hash>.lock` and writes the result as json to
+    `<hash>.json`. A process that finds the lock taken waits for it, and uses the result if it
+    was written less than `result_ttl` seconds ago. If it has to wait longer than `timeout`, it
+    runs the function itself. The directory must be private to this user, see
+    `check_private_directory`, and a result is only used if this user wrote it for the key.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        timeout: float = 15.0,
+        result_ttl: float = 10.0,
+        cleanup_interval: float = 60.0,
+    ):
+        self.path: Optional[str] = None
+        if path is not None:
+            self.set_path(path)
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self.cleanup_interval = cleanup_interval
+        self.led = 0
+        self.shared = 0
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._cleaned_at = time.monotonic()
+
+    def set_path(self, path: str):
+        """Also share the results with the processes that use the same directory."""
+        check_private_directory(path)
+        self.path = path
+
+    def do(self, key: str, function: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+        if not is_leader:
+            if not call.done.wait(self.timeout):
+                return function()
+            with self._lock:
+                self.shared += 1
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            if self.path is None:
+                with self._lock:
+                    self.led += 1
+                call.result = function()
+            else:
+                call.result = self._do_shared(key, function)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _do_shared(self, key: str, function: Callable[[], T]) -> T:
+        assert self.path is not None
+        name = hashlib.sha1(key.encode()).hexdigest()
+        lock_path = os.path.join(self.path, f"{name}.lock")
+        result_path = os.path.join(self.path, f"{name}.json")
+        try:
+            lock_file = open(lock_path, "a")
+        except OSError:
+            logger.warning(f"Can't open {lock_path}, not sharing the result between processes")
+            with self._lock:
+                self.led += 1
+            return function()
+        with lock_file:
+            is_locked = self._lock_file(lock_file)
+            result = self._read_result(result_path, key)
+            if result is not None:
+                with self._lock:
+                    self.shared += 1
+                return result
+            with self._lock:
+                self.led += 1
+            result = function()
+            if is_locked:
+                os.utime(lock_path)
+                self._write_result(result_path, key, result)
+        self._cleanup()
+        return result
+
+    def _lock_file(self, lock_file: IO) -> bool:
+        """Wait for the exclusive lock on the file, return if it was acquired in time."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    return False
+                time.sleep(0.01)
+
+    def _read_result(self, result_path: str, key: str) -> Optional[Any]:
+        """Return the result in the file, if this user wrote it for the key not too long ago."""
+        try:
+            fd = os.open(result_path, os.O_RDONLY | os.O_NOFOLLOW)
+        except OSError:
+            return None
+        try:
+            with os.fdopen(fd) as f:
+                info = os.fstat(f.fileno())
+                if (
+                    not stat.S_ISREG(info.st_mode)
+                    or info.st_uid != os.getuid()
+                    or time.time() - info.st_mtime > self.result_ttl
+                ):
+                    return None
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("key") != key:
+            return None
+        return data.get("result")
+
+    @staticmethod
+    def _write_result(result_path: str, key: str, result: Any):
+        path_tmp = f"{result_path}.{os.getpid()}.tmp"
+        with open(path_tmp, "w") as f:
+            json.dump({"key": key, "result": result}, f)
+        os.replace(path_tmp, result_path)
+
+    def _cleanup(self):
+        """Remove the files that weren't used for a while, at most once per cleanup_interval.
+
+        Removing a lock file that another process has just opened can at worst make two
+        processes run the same function.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._cleaned_at < self.cleanup_interval:
+                return
+            self._cleaned_at = now
+        assert self.path is not None
+        expired = time.time() - self.cleanup_interval
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < expired:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"led": self.led, "shared": self.shared}
@@ -0,0 +1,103 @@
+import contextvars
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Mapping, Optional, TypeVar
+
+import flask
+from elasticsearch import Elasticsearch, Transport  # type: ignore
+from elasticsearch.connection import Urllib3HttpConnection  # type: ignore
+from elasticsearch_dsl.connections import connections
+from urllib3.connection import HTTPConnection
+
+T = TypeVar("T")
+
+_round_trips_lock = threading.Lock()
+
+_max_concurrency = 4
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_THREAD_NAME_PREFIX = "es-concurrent"
+
+
+class RoundTripCountingTransport(Transport):
+    """Transport that counts the requests sent to Elasticsearch during a Flask request."""
+
+    def perform_request(self, method, url, headers=None, params=None, body=None):
+        if flask.has_request_context():
+            with _round_trips_lock:
+                flask.g.es_round_trips = get_round_trips() + 1
+        return super().perform_request(method, url, headers=headers, params=params, body=body)
+
+
+class KeepAliveConnection(Urllib3HttpConnection):
+    """HTTP connection that enables TCP keep-alive on the pooled sockets."""
+
+    def __init__(self, keep_alive_idle: int = 60, **kwargs):
+        super().__init__(**kwargs)
+        socket_options = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        ]
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, keep_alive_idle))
+        self.pool.conn_kw["socket_options"] = socket_options
+
+
+def setup_connection(config: Mapping[str, Optional[str]]):
+    """Create the one Elasticsearch client that the whole process shares.
+
+    Call this once per process. Under uWSGI the app is loaded in each worker after the fork
+    (`lazy-apps`), so workers don't share sockets.
+    """
+    global _max_concurrency
+    _max_concurrency = int(config.get("elasticsearch_concurrency") or 4)
+    connections.create_connection(
+        "default",
+        hosts=[config["elasticsearch_host"]],
+        transport_class=RoundTripCountingTransport,
+        connection_class=KeepAliveConnection,
+        maxsize=int(config.get("elasticsearch_maxsize") or 10),
+        keep_alive_idle=int(config.get("elasticsearch_keep_alive_idle") or 60),
+        timeout=float(config.get("elasticsearch_timeout") or 10),
+        max_retries=int(config.get("elasticsearch_max_retries") or 3),
+        retry_on_timeout=True,
+    )
+
+
+def get_client() -> Elasticsearch:
+    """Return the shared Elasticsearch client."""
+    return connections.get_connection()
+
+
+def get_round_trips() -> int:
+    """Return the number of Elasticsearch requests made for the current Flask request."""
+    if not flask.has_request_context():
+        return 0
+    return flask.g.get("es_round_trips", 0)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_max_concurrency, thread_name_prefix=_THREAD_NAME_PREFIX
+            )
+        return _executor
+
+
+def run_concurrently(*calls: Callable[[], T]) -> List[T]:
+    """Run independent calls, like Elasticsearch requests, at the same time.
+
+    The calls run in a thread pool of `elasticsearch_concurrency` threads, keep it below
+    `elasticsearch_maxsize` so they don't wait for a connection. They see the Flask context of
+    the caller, so their requests are counted. The results are in the order of the calls. If
+    a call fails, its exception is raised after all calls have finished. Calls made from
+    within the pool run one after the other, so nested use can't exhaust the pool.
+    """
+    if len(calls) < 2 or threading.current_thread().name.startswith(_THREAD_NAME_PREFIX):
+        return [call() for call in calls]
+    executor = _get_executor()
+    futures = [executor.submit(contextvars.copy_context().run, call) for call in calls]
+    wait(futures)
+    return [future.result() for future in futures]
@@ -1,24 +1,137 @@
-import re
-from typing import Dict, Iterable, List, Optional, Set, Tuple, Type
+import base64
+import functools
+import json
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Generator, Iterable, List, Mapping, Optional, Set, Tuple, Type
 
-from elasticsearch import Elasticsearch  # type: ignore
+from elasticsearch import NotFoundError, RequestError  # type: ignore
 from elasticsearch_dsl import Q, Search
 from elasticsearch_dsl.query import MultiMatch, Query
+from elasticsearch_dsl.response import Response
 
+from .cache import AliasSnapshot, SingleFlight, TTLCache, data_generation
+from .connection import get_client
 from .model import (
     BaseDocument,
     BronDoc,
-    CardNameDoc,
+    HitView,
     LocationDoc,
     NamesNerDoc,
     SpellingMistakeCandidateDoc,
+    get_doctype_from_index,
+    get_hit_view_class,
+    get_selection_info,
     index_name_to_doctype,
-    list_doctypes,
     list_index_names,
 )
+from .prefix_index import PrefixIndex, RowIndex
+from .query_parser import DateTerm, FieldTerm, Phrase, parse_query
+from .vocabulary import vocabulary_file
+
+
+@dataclass(frozen=True)
+class Clause:
+    query: Query
+    filter: bool
+    reason: str
+
+
+class QueryPlan:
+    """The clauses of a search, each either scoring or only filtering.
+
+    All clauses must match. Clauses that only constrain which cards match exactly, like a date
+    or a year range, go in filter context. Elasticsearch doesn't score those and can cache them.
+    """
+
+    def __init__(self):
+        self.clauses: List[Clause] = []
+
+    def score(self, query: Query, reason: str):
+        self.clauses.append(Clause(query=query, filter=False, reason=reason))
+
+    def filter(self, query: Query, reason: str):
+        self.clauses.append(Clause(query=query, filter=True, reason=reason))
+
+    def to_query(self) -> Query:
+        return Q(
+            "bool",
+            must=[clause.query for clause in self.clauses if not clause.filter],
+            filter=[clause.query for clause in self.clauses if clause.filter],
+        )
+
+    def explain(self) -> List[dict]:
+        """Describe the plan, for debugging."""
+        return [
+            {
+                "context": "filter" if clause.filter else "must",
+                "reason": clause.reason,
+                "query": clause.query.to_dict(),
+            }
+            for clause in self.clauses
+        ]
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    plan: QueryPlan
+    query: Query
+    keywords: FrozenSet[str]
+    highlight_fields: FrozenSet[str]
+
+
+def get_field_query(field: str, keywords: str) -> Query:
+    """Return the query if user wants to search a specific field."""
+    return Q("match", **{field: {"query": keywords, "operator": "and"}})
+
+
+@functools.lru_cache(maxsize=1000)
+def compile_query(q: str, doctypes: Tuple[Type[BaseDocument], ...]) -> CompiledQuery:
+    """Parse the search box entry and plan the Elasticsearch query, once per distinct entry.
+
+    Dates and year ranges only filter, see `QueryPlan`. Field terms score like the other words,
+    which of an `&` part are searched together in all fields.
+    """
+    selection = get_selection_info(doctypes)
+    multimatch_fields = list(selection.multimatch_fields)
+    parsed = parse_query(q, selection.field_names)
+    plan = QueryPlan()
+    keywords: Set[str] = set()
+    highlight_fields: Set[str] = set()
+    for group in parsed.groups:
+        words = []
+        for node in group:
+            keywords.update(node.get_keywords())
+            if isinstance(node, FieldTerm):
+                plan.score(get_field_query(node.field, node.value), "field term")
+                highlight_fields.add(node.field)
+                continue
+            highlight_fields.update(field.split("^")[0] for field in multimatch_fields)
+            if isinstance(node, Phrase):
+                query = Q("multi_match", type="phrase", query=node.text, fields=multimatch_fields)
+                plan.score(query, "phrase")
+            elif isinstance(node, DateTerm):
+                query = Q("multi_match", type="phrase", query=node.text, fields=multimatch_fields)
+                plan.filter(query, "date")
+            else:
+                words.append(node.text)
+        if words:
+            query = MultiMatch("multi_match", query=" ".join(words), fields=multimatch_fields)
+            plan.score(query, "keywords")
+    if parsed.year_range:
+        year_range = {"gte": parsed.year_range.start, "lte": parsed.year_range.end}
+        plan.filter(Q("range", jaar=year_range), "year range")
+    return CompiledQuery(
+        plan=plan,
+        query=plan.to_query(),
+        keywords=frozenset(keywords),
+        highlight_fields=frozenset(highlight_fields),
+    )
 
 
 class Searcher:
+    cache = TTLCache(maxsize=1000, ttl=600)
+    flight = SingleFlight()
+
     def __init__(
         self,
         q: str,
@@ -29,113 +142,65 @@ class Searcher:
         self.q: str = q
         self.start: int = start
         self.size: int = size
-        self.multimatch_fields = [
-            field for doctype in doctypes for field in doctype.get_multimatch_fields()
-        ]
-        self.possible_field_names = {
-            field for doctype in doctypes for field in doctype.get_columns()
-        }
-        year_range: Optional[Tuple[int, int]] = self.parse_year_range()
-        queries_must = []
-        self.keywords: Set[str] = set()
-        for part in self.q.split("&"):
-            part = part.strip()
-            if part:
-                queries_must.append(self.get_query(part))
-        query = Q("bool", must=queries_must)
-        indices = [doctype.Index.name for doctype in doctypes]
-        s: Search = Search(index=indices, doc_type=doctypes).query(query)
+        self._cache_key: Tuple = (
+            normalize_query(q),
+            tuple(sorted(doctype.Index.name for doctype in doctypes)),
+            start,
+            size,
+        )
+        self.selection = get_selection_info(tuple(doctypes))
+        self.multimatch_fields = list(self.selection.multimatch_fields)
+        self.possible_field_names = self.selection.field_names
+        compiled = compile_query(q, tuple(doctypes))
+        self.plan = compiled.plan
+        self.keywords: Set[str] = set(compiled.keywords)
+        self.highlight_fields: Set[str] = set(compiled.highlight_fields)
+        self.doctypes = doctypes
+        self.query = compiled.query
+        self.sort_by: Optional[str] = None
+        indices = list(self.selection.index_names)
+        s: Search = Search(index=indices, doc_type=doctypes).query(compiled.query)
         s = s[self.start : self.start + self.size]
-        if year_range:
-            s = s.filter("range", **{"jaar": {"gte": year_range[0], "lte": year_range[1]}})
-        s = s.highlight("*", number_of_fragments=0)
+        if self.highlight_fields:
+            s = s.highlight(*sorted(self.highlight_fields), number_of_fragments=0)
+        s = s.extra(track_total_hits=True)
         self.s = s
-
-    def get_query(self, q) -> Query:
-        """Turn the user entry q into a Elasticsearch query."""
-        queries: List[Query] = []
-        keywords: List[str] = []
-        if ":" in q:
-            query_list, keywords, q = self.handle_specific_field_request(q)
-            queries.extend(query_list)
-        if q:
-            queries.append(self.get_regular_query(q))
-            keywords.extend(q.split())
-        keywords = [word.strip('"') for word in keywords]
-        self.keywords.update(keywords)
-        if len(queries) == 0:
-            raise RuntimeError("No query.")
-        elif len(queries) == 1:
-            return queries[0]
-        else:
-            return Q("bool", must=queries)
+        self._response: Optional[Response] = None
+        self.cursor: Optional[str] = None
+        self.next_cursor: Optional[str] = None
 
     def handle_specific_field_request(self, q: str) -> Tuple[List[Q], List[str], str]:
         """Process the query to extract field-specific queries and return the stripped query."""
         queries = []
         keywords = []
-
-        # Create a regex pattern with possible fields
-        field_pattern = re.compile(
-            rf'({"|".join(re.escape(field) for field in self.possible_field_names)}):"([^"]+)"|'
-            rf'({"|".join(re.escape(field) for field in self.possible_field_names)}):(\S+)'
-        )
-        # Process field-specific matches
-        matches = field_pattern.findall(q)
-        for match in matches:
-            field = match[0] or match[2]
-            value = match[1].strip('"') or match[3]
-            queries.append(self.get_specific_field_query(field, value))
-            keywords.extend(value.split())
-
-        # Remove matched parts from the query
-        stripped_query = field_pattern.sub("", q).strip()
-        stripped_query = re.sub(r"\s+", " ", stripped_query)
-
-        return queries, keywords, stripped_query
-
-    @staticmethod
-    def get_specific_field_query(field: str, keywords: str) -> Query:
-        """Return the query if user wants to search a specific field."""
-        return Q("match", **{field: {"query": keywords, "operator": "and"}})
-
-    def get_regular_query(self, keywords: str) -> Query:
-        """Return the query if user wants to search in all fields."""
-        try:
-            return self.get_partial_phrase_match_query(keywords)
-        except ValueError:
-            return MultiMatch("multi_match", query=keywords, fields=self.multimatch_fields)
-
-    def get_partial_phrase_match_query(self, keywords: str) -> Query:
-        matches = re.findall(r'("[^"]*"|\d+-\d+(?:-\d+)?)', keywords)
-        if not matches:
-            raise ValueError("no phrases")
-        queries = [
-            Q("multi_match", type="phrase", query=match.strip('"'), fields=self.multimatch_fields)
-            for match in matches
-        ]
-        leftover = keywords
-        for match in matches:
-            leftover = leftover.replace(match, "")
-        leftover = leftover.strip()
-        if leftover:
-            queries.append(MultiMatch("multi_match", query=leftover, fields=self.multimatch_fields))
-        return Q("bool", must=queries)
-
-    def parse_year_range(self) -> Optional[Tuple[int, int]]:
-        pattern = re.compile(r"(\d{4})-(\d{4})")
-        match = pattern.search(self.q)
-        if match is None:
-            return None
-        year_start = int(match.group(1))
-        year_end = int(match.group(2))
-        self.q = pattern.sub(repl="", string=self.q).strip()
-        return year_start, year_end
+        other_nodes = []
+        for group in parse_query(q, self.possible_field_names).groups:
+            for node in group:
+                if isinstance(node, FieldTerm):
+                    queries.append(get_field_query(node.field, node.value))
+                    keywords.extend(node.value.split())
+                else:
+                    other_nodes.append(node.raw)
+        return queries, keywords, " ".join(other_nodes)
 
     def sort(self, sort_by: Optional[str]):
         if not sort_by:
             return
         self.s = self.s.sort(*sort_by.split(","))
+        self.sort_by = sort_by
+        self._cache_key += ("sort", sort_by)
+        self._response = None
+
+    def use_cursor(self, cursor: str):
+        """Page with search_after from the cursor instead of with from/size.
+
+        An empty cursor starts paging with a cursor at this page. The cursor for the page after
+        this one is in `next_cursor` once the search has been executed.
+        """
+        if cursor:
+            decode_cursor(cursor)
+        self.cursor = cursor
+        self._response = None
 
     @staticmethod
     def get_sort_options() -> Dict[str, str]:
@@ -144,16 +209,161 @@ class Searcher:
             "-jaar": "Jaartal (aflopend)",
         }
 
-    def count(self) -> int:
-        return self.s.count()
+    def execute(self) -> Response:
+        """Send the search to Elasticsearch, once, and return the response.
+
+        Responses are cached per data generation, so a cache hit skips Elasticsearch. On a
+        miss, identical searches that run at the same time wait for one of them and share its
+        response, also between processes if `setup_search_flight` enabled that. Pages fetched
+        with a cursor are not cached, their point in time expires.
+        """
+        if self._response is None and self.cursor is not None:
+            self._response, self.next_cursor = search_after_page(
+                self.s, self.cursor, self.size, start=self.start
+            )
+        if self._response is None:
+            key = (data_generation.get(), *self._cache_key)
+            response = self.cache.get(key)
+            if response is None:
+                s = self.s
+                raw = self.flight.do(repr(key), lambda: s.execute().to_dict())
+                response = Response(s, raw)
+                self.cache.set(key, response)
+            self._response = response
+        return self._response
 
-    def get_results(self) -> List[BaseDocument]:
-        res: List[BaseDocument] = list(self.s)
-        for hit in res:
-            if hasattr(hit.meta, "highlight"):
-                for key, values in hit.meta.highlight.to_dict().items():
-                    setattr(hit, key, " ".join(values))
-        return res
+    def count(self) -> int:
+        return self.execute().hits.total.value
+
+    def get_export_search(self) -> Search:
+        """Return the search for all the hits, without highlighting or paging."""
+        s = Search(index=list(self.selection.index_names), doc_type=self.doctypes)
+        s = s.query(self.query)
+        if self.sort_by:
+            s = s.sort(*self.sort_by.split(","))
+        return s
+
+    def get_results(self) -> List[HitView]:
+        """Return light views of the hits, with the highlighted fragments as values."""
+        results = []
+        for hit in self.execute().to_dict()["hits"]["hits"]:
+            doctype = get_doctype_from_index(hit["_index"])
+            if doctype is not None:
+                results.append(get_hit_view_class(doctype).from_hit(hit))
+        return results
+
+
+def setup_search_flight(config: Mapping[str, Optional[str]]):
+    """Let identical searches in all processes share one Elasticsearch request.
+
+    Only with a `single_flight_path` in the config, else searches are shared within a process.
+    """
+    path = config.get("single_flight_path")
+    if path:
+        Searcher.flight.set_path(path)
+
+
+POINT_IN_TIME_KEEP_ALIVE = "5m"
+# Elasticsearch's default index.max_result_window, from + size of a search can't be more
+MAX_RESULT_WINDOW = 10_000
+
+
+def get_last_from_size_page(size: int) -> int:
+    """Return the last page number that can be fetched with from/size."""
+    return max(MAX_RESULT_WINDOW // size, 1)
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(pit_id: str, search_after: Optional[list]) -> str:
+    data = json.dumps({"pit": pit_id, "after": search_after}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Optional[list]]:
+    """Return the point in time id and the sort values to search after."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        pit_id, search_after = data["pit"], data["after"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursorError(f"Invalid cursor {cursor!r}")
+    if not isinstance(pit_id, str) or not isinstance(search_after, (list, type(None))):
+        raise InvalidCursorError(f"Invalid cursor {cursor!r}")
+    return pit_id, search_after
+
+
+def search_after_page(
+    s: Search, cursor: str, size: int, start: int = 0
+) -> Tuple[Response, Optional[str]]:
+    """Execute one page of the search in a point in time, continuing after the cursor.
+
+    An empty cursor opens a new point in time on the indices of the search, and returns the
+    page at `start`. Only ask for that from the second page on, the first page doesn't need a
+    point in time. Unlike from/size paging, every next page costs the same and
+    max_result_window doesn't apply. Return the response and the cursor of the next page. On
+    the last page the point in time is closed and the cursor is None.
+    """
+    es = get_client()
+    if cursor:
+        pit_id, search_after = decode_cursor(cursor)
+    else:
+        pit_id = es.open_point_in_time(
+            index=",".join(s._index or ["_all"]), keep_alive=POINT_IN_TIME_KEEP_ALIVE
+        )["id"]
+        search_after = None
+    # the indices are part of the point in time, a search on it must not name them
+    s = s.index()
+    if "sort" not in s.to_dict():
+        s = s.sort("_score")
+    s = s.extra(
+        from_=0 if cursor else start,
+        size=size,
+        pit={"id": pit_id, "keep_alive": POINT_IN_TIME_KEEP_ALIVE},
+    )
+    if search_after:
+        s = s.extra(search_after=search_after)
+    try:
+        resp = s.execute()
+    except NotFoundError:
+        raise InvalidCursorError("The point in time of the cursor has expired")
+    except RequestError:
+        if not cursor:
+            es.close_point_in_time(body={"id": pit_id}, ignore=404)
+            raise
+        # like sort values that don't fit the sort of the search
+        raise InvalidCursorError(f"Invalid cursor {cursor!r}")
+    if len(resp.hits) < size:
+        es.close_point_in_time(body={"id": resp["pit_id"]}, ignore=404)
+        return resp, None
+    return resp, encode_cursor(resp["pit_id"], list(resp.hits[-1].meta.sort))
+
+
+def iter_hit_batches(s: Search, batch_size: int = 1000) -> Generator[List[dict], None, None]:
+    """Yield all hits of the search as raw dicts, one page of batch_size at a time.
+
+    The pages are fetched one after the other in a point in time, so only one page is in
+    memory and the last page costs as much as the first. The point in time is closed after the
+    last page, or when the generator is closed early, like when a download is cancelled.
+    """
+    cursor: Optional[str] = ""
+    pit_id: Optional[str] = None
+    try:
+        while cursor is not None:
+            resp, cursor = search_after_page(s, cursor, batch_size)
+            # search_after_page closed the point in time after the last page
+            pit_id = resp["pit_id"] if cursor is not None else None
+            hits = resp.to_dict()["hits"]["hits"]
+            if hits:
+                yield hits
+    finally:
+        if pit_id is not None:
+            get_client().close_point_in_time(body={"id": pit_id}, ignore=404)
+
+
+def normalize_query(q: str) -> str:
+    return " ".join(q.lower().split())
 
 
 def get_page_range(hits_total: int, page: int, cards_per_page: int) -> List[int]:
@@ -168,94 +378,191 @@ def get_page_range(hits_total: int, page: int, cards_per_page: int) -> List[int]
     return list(range(first_item, last_item + 1))
 
 
-def get_suggestions(keywords: Iterable[str]):
-    tokens = [token for token in keywords if not token.isdigit()]
-    s = CardNameDoc.search()
-    for field in ["naam", "inhoud", "bron", "getuigen"]:
-        s = s.suggest(
-            name=field,
-            text=" ".join(tokens),
-            term={"field": field, "size": 5, "suggest_mode": "always"},
-        )
-    s = s.extra(size=0)
-    resp = s.execute()
-    suggestions: Dict[str, Set[str]] = {}
-    tokens_set = set(tokens)
-    for res_per_token in resp.suggest.to_dict().values():
-        for token_res in res_per_token:
-            token = token_res["text"]
-            for option in token_res["options"]:
-                suggestion = option["text"]
-                if suggestion not in tokens_set:
-                    suggestions.setdefault(token, set()).add(suggestion)
-    return {k: sorted(v) for k, v in suggestions.items()}
+# like the default of the Elasticsearch term suggester, shorter words get no suggestions
+SUGGEST_MIN_WORD_LENGTH = 4
+
+
+def get_suggestion_tokens(keywords: Iterable[str]) -> List[str]:
+    return [
+        token for token in keywords if not token.isdigit() and len(token) >= SUGGEST_MIN_WORD_LENGTH
+    ]
+
+
+def get_suggestions(keywords: Iterable[str], size: int = 5) -> Dict[str, List[str]]:
+    """Return a map of token to the words of the vocabulary it might have been meant as.
+
+    The vocabulary holds the words of all card indices and is searched in this process, so this
+    costs no request to Elasticsearch.
+    """
+    vocabulary = vocabulary_file.get()
+    if vocabulary is None:
+        return {}
+    tokens = get_suggestion_tokens(keywords)
+    tokens_set = {token.lower() for token in tokens}
+    suggestions: Dict[str, List[str]] = {}
+    for token in tokens:
+        options = [
+            suggestion
+            for suggestion in vocabulary.suggest(token, size=size + len(tokens_set))
+            if suggestion not in tokens_set
+        ][:size]
+        if options:
+            suggestions[token] = sorted(options)
+    return suggestions
+
+
+def get_doc(doc_id: int, index_name: Optional[str] = None) -> Optional[HitView]:
+    """Get a card by id, from the given card index or else from any card index.
+
+    With a known index this is a single GET. Otherwise one mget looks in each card index, which
+    skips the derived indices like names-ner and bronnen.
+    """
+    es = get_client()
+    if index_name in index_name_to_doctype:
+        hit = es.get(index=index_name, id=str(doc_id), ignore=404)
+        if hit.get("found"):
+            return get_hit_view_class(index_name_to_doctype[index_name]).from_hit(hit)
+    index_names = list_index_names()
+    resp = es.mget(body={"docs": [{"_index": name, "_id": str(doc_id)} for name in index_names]})
+    for name, hit in zip(index_names, resp["docs"]):
+        if hit.get("found"):
+            return get_hit_view_class(index_name_to_doctype[name]).from_hit(hit)
+    return None
+
+
+@dataclass(frozen=True)
+class IndexStats:
+    total_docs: int
+    alias_doc_counts: Dict[str, int]
+    alias_to_index: Dict[str, str]
+
+
+_index_stats_cache = TTLCache(maxsize=1, ttl=float("inf"))
+
+
+def get_index_stats() -> IndexStats:
+    """Return the document counts of the card indices, computed once per data generation."""
+    generation = data_generation.get()
+    stats: Optional[IndexStats] = _index_stats_cache.get(generation)
+    if stats is None:
+        stats = compute_index_stats(dict(generation))
+        _index_stats_cache.set(generation, stats)
+    return stats
+
+
+def compute_index_stats(alias_to_index: Dict[str, str]) -> IndexStats:
+    alias_to_index = {
+        alias: alias_to_index[alias] for alias in list_index_names() if alias in alias_to_index
+    }
+    es = get_client()
+    indices: list[dict[str, str]] = es.cat.indices(  # type: ignore
+        index=list(alias_to_index.values()), format="json"
+    )
+    index_doc_counts = {index["index"]: int(index["docs.count"]) for index in indices}
+    alias_doc_counts = {
+        alias: index_doc_counts.get(index, 0) for alias, index in alias_to_index.items()
+    }
+    return IndexStats(
+        total_docs=sum(alias_doc_counts.values()),
+        alias_doc_counts=alias_doc_counts,
+        alias_to_index=alias_to_index,
+    )
+
+
+data_generation.on_change(get_index_stats)
 
 
-def get_doc(doc_id: int) -> BaseDocument:
-    s = Search(index="*", doc_type=list_doctypes())
-    s = s.filter("ids", values=[doc_id])
-    return list(s)[0]
+def format_int(num: int) -> str:
+    return f"{num:,d}".replace(",", ".")
 
 
-def get_number_of_total_docs() -> int:
-    s = Search()
-    s = s.index(*index_name_to_doctype.keys())
-    n_total_docs = s.count()
-    return n_total_docs
+def _load_names_index() -> PrefixIndex:
+    s = NamesNerDoc.search().source(["name"])
+    return PrefixIndex(doc.name for doc in s.scan())
 
 
-def get_indices_and_doc_counts() -> Dict[str, int]:
-    es = Elasticsearch()
-    indices: list[dict[str, str]] = es.cat.indices(index=list_index_names(), format="json")  # type: ignore
-    index_to_alias = get_index_to_alias()
-    return {index_to_alias[index["index"]]: int(index["docs.count"]) for index in indices}
+names_index: AliasSnapshot[PrefixIndex] = AliasSnapshot(NamesNerDoc.Index.name, _load_names_index)
 
 
-def get_index_to_alias() -> Dict[str, str]:
-    es = Elasticsearch()
-    aliases: list[dict[str, str]] = es.cat.aliases(name=list_index_names(), format="json")  # type: ignore
-    return {item["index"]: item["alias"] for item in aliases}
+def names_ner_search(query: str, page: int, per_page: int) -> tuple[list[str], int]:
+    return names_index.get().search(query, page=page, per_page=per_page)
 
 
-def get_index_from_alias(alias: str) -> str:
-    es = Elasticsearch()
-    return list(es.indices.get_alias(name=alias).keys())[0]
+def _load_bronnen_index() -> PrefixIndex:
+    s = BronDoc.search().source(["bron", "count"])
+    counts = {doc.bron: doc.count for doc in s.scan()}
+    return PrefixIndex(counts, counts=counts)
 
 
-def format_int(num: int) -> str:
-    return f"{num:,d}".replace(",", ".")
+bronnen_index: AliasSnapshot[PrefixIndex] = AliasSnapshot(BronDoc.Index.name, _load_bronnen_index)
 
 
-def names_ner_search(query: str, page: int, per_page: int) -> tuple[list[str], int]:
-    query_parts = query.split(" ")
-    s = NamesNerDoc.search()
-    s = s.query(Q("bool", must=[Q("prefix", name_parts=part) for part in query_parts]))
-    s = s.sort("name.keyword")
-    s = s[per_page * (page - 1) : per_page * page]
-    s.execute()
-    n_total_docs = s.count()
-    result = [doc.name for doc in s]
-    return result, n_total_docs
-
-
-def bronnen_search(query: str, page: int, per_page: int) -> tuple[dict[str, int], int]:
-    query_parts = query.split(" ")
-    s = BronDoc.search()
-    s = s.query(Q("bool", must=[Q("prefix", bron_parts=part) for part in query_parts]))
-    s = s.sort("bron.keyword")
-    s = s[per_page * (page - 1) : per_page * page]
-    s.execute()
-    n_total_docs = s.count()
-    result = {doc.bron: doc.count for doc in s}
-    return result, n_total_docs
-
-
-def get_all_spelling_mistake_candidates() -> list[SpellingMistakeCandidateDoc]:
+def bronnen_search(
+    query: str, page: int, per_page: int, sort_by_count: bool = False
+) -> tuple[list[tuple[str, int]], int]:
+    return bronnen_index.get().search_with_counts(
+        query, page=page, per_page=per_page, sort_by_count=sort_by_count
+    )
+
+
+@dataclass(frozen=True)
+class SpellingRow:
+    word: str
+    word_count: int
+    candidate: str
+    candidate_count: int
+
+
+def _load_spelling_index() -> RowIndex[SpellingRow]:
     s = SpellingMistakeCandidateDoc.search()
-    return list(s.scan())
+    docs = sorted(s.scan(), key=lambda doc: (-len(doc.word), doc.word))
+    return RowIndex(
+        [
+            (
+                SpellingRow(doc.word, doc.count, candidate, candidate_count),
+                f"{doc.word} {candidate}",
+            )
+            for doc in docs
+            for candidate, candidate_count in zip(doc.candidates, doc.candidate_counts)
+        ]
+    )
 
 
-def get_all_locations() -> list[LocationDoc]:
+spelling_index: AliasSnapshot[RowIndex[SpellingRow]] = AliasSnapshot(
+    SpellingMistakeCandidateDoc.Index.name, _load_spelling_index
+)
+
+
+def spelling_mistake_candidates_search(
+    query: str, page: int, per_page: int
+) -> tuple[list[SpellingRow], int]:
+    return spelling_index.get().search(query, page=page, per_page=per_page)
+
+
+@dataclass(frozen=True)
+class LocationRow:
+    location: str
+    variants: Tuple[Tuple[str, int], ...]
+
+
+def _load_locations_index() -> RowIndex[LocationRow]:
     s = LocationDoc.search()
-    s = s[:10_000]
-    return list(s)
+    docs = sorted(s.scan(), key=lambda doc: doc.location)
+    return RowIndex(
+        [
+            (
+                LocationRow(doc.location, tuple(zip(doc.variants, doc.variant_counts))),
+                " ".join([doc.location, *doc.variants]),
+            )
+            for doc in docs
+        ]
+    )
+
+
+locations_index: AliasSnapshot[RowIndex[LocationRow]] = AliasSnapshot(
+    LocationDoc.Index.name, _load_locations_index
+)
+
+
+def locations_search(query: str, page: int, per_page: int) -> tuple[list[LocationRow], int]:
+    return locations_index.get().search(query, page=page, per_page=per_page)
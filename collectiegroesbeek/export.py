@@ -0,0 +1,44 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator, List, Type
+
+from .model import BaseDocument, get_doctype_from_index
+
+EXPORT_MIMETYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def get_export_columns(doctypes: Iterable[Type[BaseDocument]]) -> List[str]:
+    """Return the index and id, followed by the columns of each doctype in order."""
+    columns = ["index", "id"]
+    for doctype in doctypes:
+        columns += [column for column in doctype.get_columns() if column not in columns]
+    return columns
+
+
+def hit_to_row(hit: dict) -> dict:
+    doctype = get_doctype_from_index(hit["_index"])
+    index_name = doctype.Index.name if doctype is not None else hit["_index"]
+    return {"index": index_name, "id": hit["_id"], **hit.get("_source", {})}
+
+
+def iter_csv(hit_batches: Iterable[List[dict]], columns: List[str]) -> Iterator[str]:
+    """Yield the header, and then a chunk of csv lines per batch of hits."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for hits in hit_batches:
+        writer.writerows(hit_to_row(hit) for hit in hits)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(hit_batches: Iterable[List[dict]]) -> Iterator[str]:
+    """Yield a chunk of json lines, one per hit, per batch of hits."""
+    for hits in hit_batches:
+        yield "".join(json.dumps(hit_to_row(hit), ensure_ascii=False) + "\n" for hit in hits)
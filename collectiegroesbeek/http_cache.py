@@ -0,0 +1,186 @@
+import datetime
+import functools
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+import flask
+
+from .cache import data_generation
+from .controller import normalize_query
+from .model import list_doctypes
+from .publications import publication_catalogue
+
+MICROCACHE_SECONDS = 10
+
+
+def _get_code_version() -> Tuple[str, int]:
+    """Return a hash of the modification times of the code and templates, and the latest one.
+
+    The hash is part of every ETag and the time is the earliest Last-Modified, so a
+    deployment with changed pages doesn't answer 304 for pages that browsers cached from the
+    previous version. Both are the same in all workers.
+    """
+    package_path = os.path.dirname(__file__)
+    publications_path = publication_catalogue.path
+    stats = []
+    mtime_ns = 0
+    for dirpath, dirnames, filenames in os.walk(package_path):
+        dirnames[:] = sorted(d for d in dirnames if os.path.join(dirpath, d) != publications_path)
+        for filename in sorted(filenames):
+            if filename.endswith((".py", ".html")):
+                path = os.path.join(dirpath, filename)
+                file_mtime_ns = os.stat(path).st_mtime_ns
+                mtime_ns = max(mtime_ns, file_mtime_ns)
+                stats.append(f"{os.path.relpath(path, package_path)}:{file_mtime_ns}")
+    version = hashlib.sha1("\n".join(stats).encode()).hexdigest()[:12]
+    return version, mtime_ns // 1_000_000_000
+
+
+CODE_VERSION, CODE_MTIME = _get_code_version()
+
+
+@dataclass(frozen=True)
+class Validators:
+    etag: str
+    last_modified: Optional[datetime.datetime]
+
+
+def _make_validators(parts: Iterable[str], timestamps: Iterable[float]) -> Validators:
+    etag = hashlib.sha1("\n".join([CODE_VERSION, *parts]).encode()).hexdigest()[:20]
+    # If-Modified-Since is compared without the ETag, so a newer deployment counts too
+    last_modified = max([*timestamps, CODE_MTIME])
+    return Validators(
+        etag=etag,
+        last_modified=datetime.datetime.fromtimestamp(last_modified, tz=datetime.timezone.utc),
+    )
+
+
+def get_index_timestamp(alias: str, index: str) -> Optional[float]:
+    """Return the creation time in the name of an index created by `IndexMover`."""
+    suffix = index[len(alias) + 1 :]
+    if not index.startswith(alias + "_") or not suffix.isdigit():
+        return None
+    return float(suffix)
+
+
+def data_validators(*aliases: str) -> Callable[[], Validators]:
+    """Validators from the indices behind the given aliases, or behind all aliases."""
+
+    def get_validators() -> Validators:
+        alias_to_index = data_generation.get_alias_to_index()
+        pairs = sorted(
+            (alias, index)
+            for alias, index in alias_to_index.items()
+            if not aliases or alias in aliases
+        )
+        timestamps = [get_index_timestamp(alias, index) for alias, index in pairs]
+        return _make_validators(
+            parts=[index for _, index in pairs],
+            timestamps=[timestamp for timestamp in timestamps if timestamp is not None],
+        )
+
+    return get_validators
+
+
+def publication_validators() -> Validators:
+    signature = publication_catalogue.get_signature()
+    return _make_validators(
+        parts=[f"{name}:{mtime_ns}" for name, mtime_ns in signature],
+        timestamps=[int(mtime_ns // 1_000_000_000) for _, mtime_ns in signature],
+    )
+
+
+def conditional(get_validators: Callable[[], Validators], max_age: int = 60):
+    """Make a view answer conditional requests, and let browsers and nginx cache it.
+
+    The validators are computed before the view runs, so a request with a matching
+    `If-None-Match` or `If-Modified-Since` gets a 304 without querying Elasticsearch.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            validators = get_validators()
+            request = flask.request
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(validators.etag)
+            else:
+                not_modified = (
+                    request.if_modified_since is not None
+                    and validators.last_modified is not None
+                    and validators.last_modified <= request.if_modified_since
+                )
+            if not_modified:
+                response = flask.Response(status=304)
+            else:
+                response = flask.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(validators.etag)
+            if validators.last_modified is not None:
+                response.last_modified = validators.last_modified
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def canonical_search_args(
+    q: str,
+    index_names: Iterable[str],
+    sort_by: Optional[str] = None,
+    page: int = 1,
+    cursor: Optional[str] = None,
+) -> List[Tuple[str, str]]:
+    """Return the query arguments of the one URL for a search.
+
+    The query is normalized and the selected indices are sorted, so equal searches have
+    equal URLs, which is what caches in front of the app use as key. Unknown indices are
+    dropped, and selecting all indices is the same as selecting none.
+    """
+    args = [("q", normalize_query(q))]
+    known_index_names = {doctype.Index.name for doctype in list_doctypes()}
+    selected = sorted(set(index_names) & known_index_names)
+    if len(selected) < len(known_index_names):
+        args += [("index", index_name) for index_name in selected]
+    if sort_by:
+        args.append(("sort", sort_by))
+    if page > 1:
+        args.append(("page", str(page)))
+    if cursor:
+        args.append(("cursor", cursor))
+    return args
+
+
+def search_url(
+    q: str,
+    index_names: Iterable[str],
+    sort_by: Optional[str] = None,
+    page: int = 1,
+    cursor: Optional[str] = None,
+) -> str:
+    args = canonical_search_args(q, index_names, sort_by=sort_by, page=page, cursor=cursor)
+    return flask.url_for("search") + "?" + urlencode(args, quote_via=quote)
+
+
+def microcache(view):
+    """Let a proxy cache in front of the app keep the response for a few seconds.
+
+    `X-Accel-Expires` only applies to nginx, so the Cache-Control for browsers stays as it is.
+    Pages of a cursor are specific to one visitor's point in time and are not kept.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        response = flask.make_response(view(*args, **kwargs))
+        expires = 0 if "cursor" in flask.request.args else MICROCACHE_SECONDS
+        response.headers["X-Accel-Expires"] = str(expires)
+        return response
+
+    return wrapper
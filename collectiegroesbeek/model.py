@@ -1,5 +1,8 @@
+import functools
 import re
-from typing import List, Optional, Type
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple, Type
 
 from elasticsearch_dsl import Document, Index, Integer, Keyword, Short, Text
 
@@ -15,25 +18,18 @@ class BaseDocument(Document):
         return bool(re.match(cls.Index.name + r"_\d{10}", hit["_index"]))
 
     @classmethod
-    def _get_mapping(cls) -> dict:
-        return cls._doc_type.mapping.to_dict()["properties"]
+    def _get_mapping(cls) -> Mapping[str, dict]:
+        return get_doctype_info(cls).mapping
 
     @classmethod
     def get_columns(cls) -> List[str]:
         """Return the field names to display."""
-        return [
-            field for field in cls._get_mapping().keys() if field not in ("naam_keyword", "jaar")
-        ]
+        return list(get_doctype_info(cls).columns)
 
     @classmethod
     def get_sort_field(cls, field: str) -> str:
         """Return the correct ES field to sort on."""
-        mapping = cls._get_mapping()
-        field_definition = mapping[field]
-        if field_definition["type"] == "text":
-            return f"{field}.keyword"
-        else:
-            return field
+        return get_doctype_info(cls).sort_fields[field]
 
     @classmethod
     def from_csv_line(cls, line: List[str]) -> Optional["BaseDocument"]:
@@ -62,12 +58,12 @@ class BaseDocument(Document):
 
 
 class CardNameDoc(BaseDocument):
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
-    naam: Optional[str] = Text(fields={"keyword": Keyword()})
-    inhoud: Optional[str] = Text(fields={"keyword": Keyword()})
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    getuigen: Optional[str] = Text(fields={"keyword": Keyword()})
-    bijzonderheden: Optional[str] = Text(fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    naam: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    inhoud: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    getuigen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bijzonderheden: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     naam_keyword: Optional[str] = Keyword()
     jaar: Optional[int] = Short()
@@ -154,13 +150,13 @@ def create_year(datum: str) -> Optional[int]:
 
 
 class VoornamenDoc(BaseDocument):
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
-    voornaam: Optional[str] = Text(fields={"keyword": Keyword()})
-    patroniem: Optional[str] = Text(fields={"keyword": Keyword()})
-    inhoud: Optional[str] = Text(fields={"keyword": Keyword()})
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    getuigen: Optional[str] = Text(fields={"keyword": Keyword()})
-    bijzonderheden: Optional[str] = Text(fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    voornaam: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    patroniem: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    inhoud: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    getuigen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bijzonderheden: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     jaar: Optional[int] = Short()
 
@@ -225,12 +221,12 @@ class VoornamenDoc(BaseDocument):
 
 
 class JaartallenDoc(BaseDocument):
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
-    locatie: Optional[str] = Text(fields={"keyword": Keyword()})
-    inhoud: Optional[str] = Text(fields={"keyword": Keyword()})
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    getuigen: Optional[str] = Text(fields={"keyword": Keyword()})
-    bijzonderheden: Optional[str] = Text(fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    locatie: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    inhoud: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    getuigen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bijzonderheden: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     jaar: Optional[int] = Short()
 
@@ -295,20 +291,20 @@ class JaartallenDoc(BaseDocument):
 
 
 class MaatboekHeemskerkDoc(BaseDocument):
-    locatie: Optional[str] = Text(fields={"keyword": Keyword()})
-    sector: Optional[str] = Text(fields={"keyword": Keyword()})
+    locatie: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    sector: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
-    eigenaar: Optional[str] = Text(fields={"keyword": Keyword()})
-    huurder: Optional[str] = Text(fields={"keyword": Keyword()})
+    eigenaar: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    huurder: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
-    oppervlakte: Optional[str] = Text(fields={"keyword": Keyword()})
-    prijs: Optional[str] = Text(fields={"keyword": Keyword()})
+    oppervlakte: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    prijs: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
     jaar: Optional[int] = Short()
 
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    opmerkingen: Optional[str] = Text(fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    opmerkingen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     class Index:
         name: str = "maatboek-heemskerk"
@@ -388,14 +384,14 @@ class MaatboekHeemskerkDoc(BaseDocument):
 
 
 class MaatboekHeemstedeDoc(BaseDocument):
-    ligging: Optional[str] = Text(fields={"keyword": Keyword()})
-    eigenaar: Optional[str] = Text(fields={"keyword": Keyword()})
-    huurder: Optional[str] = Text(fields={"keyword": Keyword()})
-    prijs: Optional[str] = Text(fields={"keyword": Keyword()})
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
+    ligging: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    eigenaar: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    huurder: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    prijs: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
     jaar: Optional[int] = Short()
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    opmerkingen: Optional[str] = Text(fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    opmerkingen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     class Index:
         name: str = "maatboek-heemstede"
@@ -460,14 +456,14 @@ class MaatboekHeemstedeDoc(BaseDocument):
 
 
 class MaatboekBroekInWaterlandDoc(BaseDocument):
-    sector: Optional[str] = Text(fields={"keyword": Keyword()})
-    ligging: Optional[str] = Text(fields={"keyword": Keyword()})
-    oppervlakte: Optional[str] = Text(fields={"keyword": Keyword()})
-    eigenaar: Optional[str] = Text(fields={"keyword": Keyword()})
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
+    sector: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    ligging: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    oppervlakte: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    eigenaar: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
     jaar: Optional[int] = Short()
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    opmerkingen: Optional[str] = Text(fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    opmerkingen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     class Index:
         name: str = "maatboek-broek-in-waterland"
@@ -530,14 +526,14 @@ class MaatboekBroekInWaterlandDoc(BaseDocument):
 
 
 class MaatboekSuderwoude(BaseDocument):
-    sector: Optional[str] = Text(fields={"keyword": Keyword()})
-    ligging: Optional[str] = Text(fields={"keyword": Keyword()})
-    oppervlakte: Optional[str] = Text(fields={"keyword": Keyword()})
-    eigenaar: Optional[str] = Text(fields={"keyword": Keyword()})
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
+    sector: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    ligging: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    oppervlakte: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    eigenaar: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
     jaar: Optional[int] = Short()
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    opmerkingen: Optional[str] = Text(fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    opmerkingen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     class Index:
         name: str = "maatboek-suderwoude"
@@ -600,14 +596,14 @@ class MaatboekSuderwoude(BaseDocument):
 
 
 class EigendomsaktenHeemskerk(BaseDocument):
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
-    plaats: Optional[str] = Text(fields={"keyword": Keyword()})
-    verkoper: Optional[str] = Text(fields={"keyword": Keyword()})
-    koper: Optional[str] = Text(fields={"keyword": Keyword()})
-    omschrijving: Optional[str] = Text(fields={"keyword": Keyword()})
-    belending: Optional[str] = Text(fields={"keyword": Keyword()})
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    opmerkingen: Optional[str] = Text(fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    plaats: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    verkoper: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    koper: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    omschrijving: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    belending: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    opmerkingen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     jaar: Optional[int] = Short()
 
@@ -674,12 +670,12 @@ class EigendomsaktenHeemskerk(BaseDocument):
 
 
 class TiendeEnHonderdstePenning(BaseDocument):
-    datum: str = Text(fields={"keyword": Keyword()})
-    inhoud: str = Text(fields={"keyword": Keyword()})
-    folio_nr: str = Text(fields={"keyword": Keyword()})
-    vervolg_nr: Optional[str] = Text(fields={"keyword": Keyword()})
-    bron: str = Text(fields={"keyword": Keyword()})
-    bijzonderheden: Optional[str] = Text(fields={"keyword": Keyword()})
+    datum: str = Text(index_options="offsets", fields={"keyword": Keyword()})
+    inhoud: str = Text(index_options="offsets", fields={"keyword": Keyword()})
+    folio_nr: str = Text(index_options="offsets", fields={"keyword": Keyword()})
+    vervolg_nr: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bron: str = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bijzonderheden: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     jaar: Optional[int] = Short()
 
@@ -759,11 +755,11 @@ class TiendePenningHaarlemDoc(TiendeEnHonderdstePenning):
 
 
 class BaseTransportregisterDoc(BaseDocument):
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
-    inhoud: Optional[str] = Text(fields={"keyword": Keyword()})
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    getuigen: Optional[str] = Text(fields={"keyword": Keyword()})
-    bijzonderheden: Optional[str] = Text(fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    inhoud: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    getuigen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bijzonderheden: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     jaar: Optional[int] = Short()
 
@@ -863,12 +859,12 @@ class TransportRegisterZijpeDoc(BaseTransportregisterDoc):
 
 
 class TransportRegisterHaarlemDoc(BaseDocument):
-    datum: str = Text(fields={"keyword": Keyword()})
-    inhoud: str = Text(fields={"keyword": Keyword()})
-    folio_nr: str = Text(fields={"keyword": Keyword()})
-    register_nr: str = Text(fields={"keyword": Keyword()})
-    vervolg_nr: str = Text(fields={"keyword": Keyword()})
-    bijzonderheden: Optional[str] = Text(fields={"keyword": Keyword()})
+    datum: str = Text(index_options="offsets", fields={"keyword": Keyword()})
+    inhoud: str = Text(index_options="offsets", fields={"keyword": Keyword()})
+    folio_nr: str = Text(index_options="offsets", fields={"keyword": Keyword()})
+    register_nr: str = Text(index_options="offsets", fields={"keyword": Keyword()})
+    vervolg_nr: str = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bijzonderheden: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     jaar: Optional[int] = Short()
 
@@ -931,12 +927,12 @@ class TransportRegisterHaarlemDoc(BaseDocument):
 
 
 class HaarlemAlgemeenDoc(BaseDocument):
-    datum: Optional[str] = Text(fields={"keyword": Keyword()})
-    locatie: Optional[str] = Text(fields={"keyword": Keyword()})
-    inhoud: Optional[str] = Text(fields={"keyword": Keyword()})
-    bron: Optional[str] = Text(fields={"keyword": Keyword()})
-    getuigen: Optional[str] = Text(fields={"keyword": Keyword()})
-    bijzonderheden: Optional[str] = Text(fields={"keyword": Keyword()})
+    datum: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    locatie: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    inhoud: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bron: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    getuigen: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
+    bijzonderheden: Optional[str] = Text(index_options="offsets", fields={"keyword": Keyword()})
 
     jaar: Optional[int] = Short()
 
@@ -1031,6 +1027,149 @@ def list_doctypes() -> List[Type[BaseDocument]]:
     return list(index_number_to_doctype.values())
 
 
+@dataclass(frozen=True)
+class DoctypeInfo:
+    """What we need to know about a doctype, derived once from its mapping."""
+
+    mapping: Mapping[str, dict]
+    columns: Tuple[str, ...]
+    sort_fields: Mapping[str, str]
+    multimatch_fields: Tuple[str, ...]
+
+
+def _create_doctype_info(doctype: Type[BaseDocument]) -> DoctypeInfo:
+    mapping = doctype._doc_type.mapping.to_dict()["properties"]
+    return DoctypeInfo(
+        mapping=MappingProxyType(mapping),
+        columns=tuple(field for field in mapping if field not in ("naam_keyword", "jaar")),
+        sort_fields=MappingProxyType(
+            {
+                field: f"{field}.keyword" if definition["type"] == "text" else field
+                for field, definition in mapping.items()
+            }
+        ),
+        multimatch_fields=tuple(doctype.get_multimatch_fields()),
+    )
+
+
+_doctype_infos: Dict[Type[BaseDocument], DoctypeInfo] = {
+    doctype: _create_doctype_info(doctype) for doctype in list_doctypes()
+}
+
+
+def get_doctype_info(doctype: Type[BaseDocument]) -> DoctypeInfo:
+    info = _doctype_infos.get(doctype)
+    if info is None:
+        info = _doctype_infos[doctype] = _create_doctype_info(doctype)
+    return info
+
+
+class HitView:
+    """Light read-only view of a raw hit, that formats like its doctype.
+
+    Instantiating a Document for each hit is slow, and we only need the display methods. Each
+    doctype gets a subclass, see `get_hit_view_class`, with a slot per field and with the
+    `get_title`, `get_subtitle` and `get_body_lines` functions of the doctype.
+    """
+
+    __slots__ = ("_id", "_score")
+    _id: str
+    _score: Optional[float]
+    doctype: Type[BaseDocument]
+    fields: Tuple[str, ...]
+
+    @classmethod
+    def from_hit(cls, hit: Mapping) -> "HitView":
+        """Create the view from a raw hit, with highlighted fragments instead of the values."""
+        view = cls.__new__(cls)
+        view._id = hit["_id"]
+        view._score = hit.get("_score")
+        source = hit.get("_source", {})
+        for field in cls.fields:
+            setattr(view, field, source.get(field))
+        for field, fragments in hit.get("highlight", {}).items():
+            if field in cls.fields:
+                setattr(view, field, " ".join(fragments))
+        return view
+
+    @property
+    def id(self) -> str:
+        return self._id
+
+    @property
+    def score(self) -> Optional[float]:
+        return self._score
+
+    @property
+    def index_name(self) -> str:
+        return self.doctype.Index.name
+
+    def get_index_name_pretty(self) -> str:
+        return self.doctype.get_index_name_pretty()
+
+    def get_title(self) -> str:
+        raise NotImplementedError()
+
+    def get_subtitle(self) -> str:
+        raise NotImplementedError()
+
+    def get_body_lines(self) -> List[str]:
+        raise NotImplementedError()
+
+
+def _create_hit_view_class(doctype: Type[BaseDocument]) -> Type[HitView]:
+    fields = tuple(get_doctype_info(doctype).mapping)
+    namespace = {
+        "__slots__": fields,
+        "doctype": doctype,
+        "fields": fields,
+        "get_title": doctype.get_title,
+        "get_subtitle": doctype.get_subtitle,
+        "get_body_lines": doctype.get_body_lines,
+    }
+    return type(f"{doctype.__name__}HitView", (HitView,), namespace)
+
+
+_hit_view_classes: Dict[Type[BaseDocument], Type[HitView]] = {
+    doctype: _create_hit_view_class(doctype) for doctype in list_doctypes()
+}
+
+
+def get_hit_view_class(doctype: Type[BaseDocument]) -> Type[HitView]:
+    view_class = _hit_view_classes.get(doctype)
+    if view_class is None:
+        view_class = _hit_view_classes[doctype] = _create_hit_view_class(doctype)
+    return view_class
+
+
+@functools.lru_cache(maxsize=256)
+def get_doctype_from_index(index: str) -> Optional[Type[BaseDocument]]:
+    """Return the doctype of an index `<alias>_<epoch>` as created by `IndexMover`."""
+    match = re.fullmatch(r"(.+)_\d{10}", index)
+    return index_name_to_doctype.get(match.group(1) if match else index)
+
+
+@dataclass(frozen=True)
+class SelectionInfo:
+    """What we need to know to search a combination of doctypes."""
+
+    index_names: Tuple[str, ...]
+    multimatch_fields: Tuple[str, ...]
+    field_names: FrozenSet[str]
+
+
+@functools.lru_cache(maxsize=256)
+def get_selection_info(doctypes: Tuple[Type[BaseDocument], ...]) -> SelectionInfo:
+    infos = [get_doctype_info(doctype) for doctype in doctypes]
+    return SelectionInfo(
+        index_names=tuple(doctype.Index.name for doctype in doctypes),
+        multimatch_fields=tuple(
+            dict.fromkeys(field for info in infos for field in info.multimatch_fields)
+        ),
+        field_names=frozenset(field for info in infos for field in info.columns),
+    )
+
+
 # MAPPING = {
 #     doctype.Index.name: doctype
 #     for doctype in list_doctypes()
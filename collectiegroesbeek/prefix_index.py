@@ -0,0 +1,144 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Generic, Iterable, List, Mapping, Optional, Sequence, Tuple, TypeVar
+
+from .cache import TTLCache
+
+T = TypeVar("T")
+
+
+class PrefixIndex:
+    """In-memory index to find the entries of which each query word starts one of its words.
+
+    This is the same as an AND of prefix queries on the lowercased, space separated words of an
+    entry. The entries are kept sorted. The distinct words are kept in a sorted list, and for
+    each word an array holds the positions of the entries that contain it, all concatenated in
+    one flat array.
+
+    Entries can carry a count, then results can also be ordered by descending count.
+    """
+
+    def __init__(self, entries: Iterable[str], counts: Optional[Mapping[str, int]] = None):
+        self.entries: List[str] = sorted(set(entries))
+        self.counts = array("I", (counts[entry] for entry in self.entries) if counts else [])
+        # the positions ordered by count, and per position its rank in that order
+        self._by_count = array(
+            "I", sorted(range(len(self.counts)), key=lambda position: -self.counts[position])
+        )
+        self._count_rank = array("I", bytes(4 * len(self._by_count)))
+        for rank, position in enumerate(self._by_count):
+            self._count_rank[position] = rank
+        word_to_positions: Dict[str, List[int]] = {}
+        for position, entry in enumerate(self.entries):
+            for word in set(entry.lower().split(" ")):
+                word_to_positions.setdefault(word, []).append(position)
+        self._words: List[str] = sorted(word_to_positions)
+        self._offsets = array("I", [0])
+        self._positions = array("I")
+        for word in self._words:
+            self._positions.extend(word_to_positions[word])
+            self._offsets.append(len(self._positions))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _word_range(self, prefix: str) -> Tuple[int, int]:
+        """Return the range in the flat positions array of the words starting with prefix."""
+        start = bisect_left(self._words, prefix)
+        end = bisect_left(self._words, prefix + "\U0010ffff", lo=start)
+        return self._offsets[start], self._offsets[end]
+
+    def find(self, query: str) -> List[int]:
+        """Return the sorted positions of the entries that match all words of the query."""
+        prefixes = [prefix for prefix in query.lower().split(" ") if prefix]
+        if not prefixes:
+            return list(range(len(self.entries)))
+        # start with the prefix with the fewest matches, so the intersections stay small
+        ranges = sorted(
+            (self._word_range(prefix) for prefix in prefixes), key=lambda r: r[1] - r[0]
+        )
+        start, end = ranges[0]
+        matches = set(self._positions[start:end])
+        for start, end in ranges[1:]:
+            if not matches:
+                break
+            matches.intersection_update(self._positions[start:end])
+        return sorted(matches)
+
+    def find_page(
+        self, query: str, page: int, per_page: int, sort_by_count: bool = False
+    ) -> Tuple[List[int], int]:
+        """Return the positions of one page of matches, and the total number of matches.
+
+        Pages before the first are the first page.
+        """
+        page = max(page, 1)
+        start, end = per_page * (page - 1), per_page * page
+        sort_by_count = sort_by_count and len(self.counts) > 0
+        if not query.strip():
+            positions = range(len(self.entries))
+            if sort_by_count:
+                return list(self._by_count[start:end]), len(positions)
+            return list(positions[start:end]), len(positions)
+        matches = self.find(query)
+        if sort_by_count:
+            matches.sort(key=self._count_rank.__getitem__)
+        return matches[start:end], len(matches)
+
+    def search(self, query: str, page: int, per_page: int) -> Tuple[List[str], int]:
+        """Return one page of matching entries, in order, and the total number of matches."""
+        positions, total = self.find_page(query, page=page, per_page=per_page)
+        return [self.entries[position] for position in positions], total
+
+    def search_with_counts(
+        self, query: str, page: int, per_page: int, sort_by_count: bool = False
+    ) -> Tuple[List[Tuple[str, int]], int]:
+        """Return one page of matching entries with their counts, and the number of matches."""
+        positions, total = self.find_page(
+            query, page=page, per_page=per_page, sort_by_count=sort_by_count
+        )
+        return [(self.entries[position], self.counts[position]) for position in positions], total
+
+
+class RowIndex(Generic[T]):
+    """In-memory rows in display order, to filter on their text and page through.
+
+    A row matches when each query word occurs somewhere in its text. The positions of the
+    matches are cached per query, so the next pages of the same filter are only a slice.
+    """
+
+    def __init__(self, rows: Sequence[Tuple[T, str]]):
+        self.rows: List[T] = [row for row, _ in rows]
+        self._texts: List[str] = [text.lower() for _, text in rows]
+        self._matches = TTLCache(maxsize=100, ttl=600)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def find(self, query: str) -> Sequence[int]:
+        """Return the positions of the rows that contain all words of the query, in order."""
+        words = tuple(sorted(set(query.lower().split())))
+        if not words:
+            return range(len(self.rows))
+        matches = self._matches.get(words)
+        if matches is None:
+            matches = array(
+                "I",
+                (
+                    position
+                    for position, text in enumerate(self._texts)
+                    if all(word in text for word in words)
+                ),
+            )
+            self._matches.set(words, matches)
+        return matches
+
+    def search(self, query: str, page: int, per_page: int) -> Tuple[List[T], int]:
+        """Return one page of matching rows, in order, and the total number of matches.
+
+        Pages before the first are the first page.
+        """
+        page = max(page, 1)
+        matches = self.find(query)
+        positions = matches[per_page * (page - 1) : per_page * page]
+        return [self.rows[position] for position in positions], len(matches)
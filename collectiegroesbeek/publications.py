@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PUBLICATIONS_PATH = os.path.join(os.path.dirname(__file__), "templates", "publicaties")
+
+
+@dataclass(frozen=True)
+class Publication:
+    publicatie: str
+    titel: str
+    jaar: Any
+    afkomstig_uit: str
+    omschrijving: str
+    categorie: str
+    metadata: Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class Catalogue:
+    publications: Tuple[Publication, ...]
+    """Sorted by year."""
+    categories: Tuple[str, ...]
+    by_name: Dict[str, Publication]
+
+
+class PublicationCatalogue:
+    """The publications in the templates folder, each a html page with a json metadata file.
+
+    The catalogue is read once and kept in memory. At most once every `check_interval` seconds
+    the modification times of the files are compared, and it is read again if any changed or
+    if files were added or removed.
+    """
+
+    def __init__(
+        self,
+        path: str = PUBLICATIONS_PATH,
+        check_interval: float = 10.0,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.path = path
+        self.check_interval = check_interval
+        self.timer = timer
+        self._catalogue: Optional[Catalogue] = None
+        self._signature: Tuple[Tuple[str, int], ...] = ()
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Catalogue:
+        with self._lock:
+            self._check()
+            assert self._catalogue is not None
+            return self._catalogue
+
+    def get_signature(self) -> Tuple[Tuple[str, int], ...]:
+        """Return the names and modification times (ns) of the files of the catalogue."""
+        with self._lock:
+            self._check()
+            return self._signature
+
+    def _check(self):
+        now = self.timer()
+        if self._checked_at is None or now - self._checked_at > self.check_interval:
+            signature = self._read_signature()
+            if self._catalogue is None or signature != self._signature:
+                self._catalogue = self._load()
+                self._signature = signature
+            self._checked_at = now
+
+    def _read_signature(self) -> Tuple[Tuple[str, int], ...]:
+        with os.scandir(self.path) as entries:
+            return tuple(
+                sorted(
+                    (entry.name, entry.stat().st_mtime_ns)
+                    for entry in entries
+                    if entry.name.endswith((".html", ".json"))
+                )
+            )
+
+    def _load(self) -> Catalogue:
+        publications = []
+        for filename_html in os.listdir(self.path):
+            if not filename_html.endswith(".html"):
+                continue
+            filename_json = filename_html.replace(".html", ".json")
+            with open(os.path.join(self.path, filename_json)) as f:
+                metadata = json.load(f)
+            publications.append(
+                Publication(
+                    publicatie=filename_html.replace(".html", ""),
+                    titel=metadata["titel"],
+                    jaar=metadata["jaar"],
+                    afkomstig_uit=metadata["afkomstig uit"],
+                    omschrijving=metadata["omschrijving"],
+                    categorie=metadata["categorie"],
+                    metadata=metadata,
+                )
+            )
+        publications.sort(key=lambda publication: publication.jaar)
+        return Catalogue(
+            publications=tuple(publications),
+            categories=tuple(sorted({publication.categorie for publication in publications})),
+            by_name={publication.publicatie: publication for publication in publications},
+        )
+
+
+publication_catalogue = PublicationCatalogue()
@@ -0,0 +1,119 @@
+import re
+from dataclasses import dataclass
+from typing import AbstractSet, List, Optional, Tuple, Union
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<amp>&)
+    | (?P<year_start>\d{4})-(?P<year_end>\d{4})(?![^\s&])
+    | (?P<field>[^\s:&"]+):(?:"(?P<field_phrase>[^"]+)"|(?P<field_value>[^\s&]+))
+    | "(?P<phrase>[^"]*)"
+    | (?P<date>\d+-\d+(?:-\d+)?)(?![^\s&])
+    | (?P<term>[^\s&]+)
+    | \s+
+    """,
+    re.VERBOSE,
+)
+
+
+@dataclass(frozen=True)
+class Term:
+    text: str
+
+    @property
+    def raw(self) -> str:
+        return self.text
+
+    def get_keywords(self) -> List[str]:
+        return [self.text.strip('"')]
+
+
+@dataclass(frozen=True)
+class Phrase:
+    text: str
+
+    @property
+    def raw(self) -> str:
+        return f'"{self.text}"'
+
+    def get_keywords(self) -> List[str]:
+        return self.text.split()
+
+
+@dataclass(frozen=True)
+class DateTerm:
+    """A date like 1650-03-12, or part of one."""
+
+    text: str
+
+    @property
+    def raw(self) -> str:
+        return self.text
+
+    def get_keywords(self) -> List[str]:
+        return [self.text]
+
+
+@dataclass(frozen=True)
+class FieldTerm:
+    field: str
+    value: str
+
+    @property
+    def raw(self) -> str:
+        return f'{self.field}:"{self.value}"' if " " in self.value else f"{self.field}:{self.value}"
+
+    def get_keywords(self) -> List[str]:
+        return [word.strip('"') for word in self.value.split()]
+
+
+Node = Union[Term, Phrase, DateTerm, FieldTerm]
+
+
+@dataclass(frozen=True)
+class YearRange:
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    groups: Tuple[Tuple[Node, ...], ...]
+    """The parts separated by `&`, each a sequence of nodes."""
+    year_range: Optional[YearRange]
+    """The first year range like 1500-1600, which applies to the whole query."""
+
+
+def parse_query(q: str, field_names: AbstractSet[str]) -> ParsedQuery:
+    """Parse a search box entry in one pass over its tokens.
+
+    A `name:value` or `name:"more values"` is a field term if name is one of field_names, else
+    it is searched as text like the rest.
+    """
+    groups: List[List[Node]] = [[]]
+    year_range: Optional[YearRange] = None
+    for match in TOKEN_PATTERN.finditer(q):
+        nodes = groups[-1]
+        if match["amp"]:
+            groups.append([])
+        elif match["year_start"]:
+            if year_range is None:
+                year_range = YearRange(int(match["year_start"]), int(match["year_end"]))
+        elif match["field"]:
+            field, field_phrase = match["field"], match["field_phrase"]
+            if field in field_names:
+                nodes.append(FieldTerm(field, field_phrase or match["field_value"]))
+            elif field_phrase is not None:
+                nodes.extend([Term(f"{field}:"), Phrase(field_phrase)])
+            else:
+                nodes.append(Term(match[0]))
+        elif match["phrase"] is not None:
+            if match["phrase"]:
+                nodes.append(Phrase(match["phrase"]))
+        elif match["date"]:
+            nodes.append(DateTerm(match["date"]))
+        elif match["term"]:
+            nodes.append(Term(match["term"]))
+    return ParsedQuery(
+        groups=tuple(tuple(nodes) for nodes in groups if nodes), year_range=year_range
+    )
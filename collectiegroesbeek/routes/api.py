@@ -1,9 +1,17 @@
-from typing import Any
+from typing import Any, Iterator, Optional
 
 import flask
 
 from .. import app
-from ..model import index_name_to_doctype
+from ..controller import (
+    InvalidCursorError,
+    Searcher,
+    iter_hit_batches,
+    normalize_query,
+    search_after_page,
+)
+from ..export import EXPORT_MIMETYPES, get_export_columns, iter_csv, iter_jsonl
+from ..model import index_name_to_doctype, list_doctypes
 
 
 @app.route("/api/columns/")
@@ -24,7 +32,6 @@ def datatables_api():
     s = doctype.search()
     columns = doctype.get_columns()
     s = s.source(columns)
-    s = s.extra(from_=req["start"], size=req["length"])
     s = s.sort(
         *[
             {doctype.get_sort_field(req["columns"][item["column"]]["data"]): {"order": item["dir"]}}
@@ -36,17 +43,89 @@ def datatables_api():
             s = s.query(
                 "match", **{column["data"]: {"query": column["search"]["value"], "operator": "and"}}
             )
-    res = s.execute()
+    # a cursor continues from the previous page, an empty one starts paging with a cursor at
+    # `start`, and without one it's a page with from/size
+    cursor: Optional[str] = req.get("cursor")
+    next_cursor = None
+    if cursor is None:
+        s = s.extra(from_=req["start"], size=req["length"])
+        res = s.execute()
+    else:
+        if not isinstance(cursor, str):
+            return flask.abort(400)
+        try:
+            res, next_cursor = search_after_page(s, cursor, req["length"], start=req["start"])
+        except InvalidCursorError:
+            return flask.abort(400)
     docs = []
-    for hit in res:
-        hit_dict = hit.to_dict()
-        doc = {field: hit_dict.get(field, None) for field in columns}
-        doc["id"] = hit.meta.id
+    for hit in res.to_dict()["hits"]["hits"]:
+        source = hit.get("_source", {})
+        doc = {field: source.get(field) for field in columns}
+        doc["id"] = hit["_id"]
         docs.append(doc)
     resp = {
         "draw": int(req["draw"]),
         "recordsTotal": res["hits"]["total"]["value"],
         "recordsFiltered": res["hits"]["total"]["value"],
         "data": docs,
+        "cursor": next_cursor,
     }
     return resp
+
+
+@app.route("/api/plan/")
+def query_plan_api():
+    """Show how a search is planned, for debugging."""
+    q = flask.request.args.get("q", default="", type=str)
+    index_names = flask.request.args.getlist("index")
+    if any(index_name not in index_name_to_doctype for index_name in index_names):
+        return flask.abort(400)
+    doctypes = [index_name_to_doctype[index_name] for index_name in index_names]
+    searcher = Searcher(q.lower(), start=0, size=10, doctypes=doctypes or list_doctypes())
+    return {"plan": searcher.plan.explain(), "query": searcher.s.to_dict()["query"]}
+
+
+@app.route("/api/export/")
+def export_api():
+    """Download all hits of a search as csv or json lines, streamed as they are fetched."""
+    q = normalize_query(flask.request.args.get("q", default="", type=str))
+    index_names = flask.request.args.getlist("index")
+    sort_by = flask.request.args.get("sort", default=None)
+    export_format = flask.request.args.get("format", default="csv")
+    if any(index_name not in index_name_to_doctype for index_name in index_names):
+        return flask.abort(400)
+    if sort_by and sort_by not in Searcher.get_sort_options():
+        return flask.abort(400)
+    if export_format not in EXPORT_MIMETYPES:
+        return flask.abort(400)
+    doctypes = [index_name_to_doctype[index_name] for index_name in index_names]
+    doctypes = doctypes or list_doctypes()
+    searcher = Searcher(q, start=0, size=0, doctypes=doctypes)
+    searcher.sort(sort_by)
+    hit_batches = iter_hit_batches(searcher.get_export_search())
+    if export_format == "csv":
+        chunks = iter_csv(hit_batches, get_export_columns(doctypes))
+    else:
+        chunks = iter_jsonl(hit_batches)
+
+    def generate() -> Iterator[str]:
+        # the server closes this generator when the client goes away, which closes the batches
+        try:
+            yield from chunks
+        finally:
+            hit_batches.close()
+
+    resp = flask.Response(
+        flask.stream_with_context(generate()), mimetype=EXPORT_MIMETYPES[export_format]
+    )
+    resp.headers["Content-Disposition"] = (
+        f'attachment; filename="collectiegroesbeek.{export_format}"'
+    )
+    # let nginx pass the chunks on as they come instead of buffering the whole download
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@app.route("/api/stats/")
+def stats_api():
+    return {"search_cache": Searcher.cache.stats(), "search_flight": Searcher.flight.stats()}
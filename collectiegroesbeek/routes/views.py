@@ -1,32 +1,57 @@
-import json
-import os
-import posixpath
 import re
-from typing import List, Tuple, Type
+from typing import List, Optional, Tuple, Type
 from urllib.parse import quote
 
 import flask
 
 from .. import app, controller
+from ..connection import get_round_trips
 from ..controller import (
+    InvalidCursorError,
     bronnen_search,
     format_int,
-    get_all_locations,
-    get_all_spelling_mistake_candidates,
     get_doc,
-    get_indices_and_doc_counts,
-    get_number_of_total_docs,
+    get_index_stats,
+    locations_search,
     names_ner_search,
+    normalize_query,
+    spelling_mistake_candidates_search,
 )
-from ..model import BaseDocument, index_name_to_doctype, list_doctypes
+from ..http_cache import (
+    canonical_search_args,
+    conditional,
+    data_validators,
+    microcache,
+    publication_validators,
+    search_url,
+)
+from ..model import (
+    BaseDocument,
+    BronDoc,
+    HitView,
+    LocationDoc,
+    NamesNerDoc,
+    SpellingMistakeCandidateDoc,
+    TransportRegisterHaarlemDoc,
+    index_name_to_doctype,
+    list_doctypes,
+)
+from ..publications import publication_catalogue
+
+
+@app.after_request
+def add_round_trips_header(response: flask.Response) -> flask.Response:
+    response.headers["X-ES-Round-Trips"] = str(get_round_trips())
+    return response
 
 
 @app.route("/")
+@conditional(data_validators())
 def home():
-    n_total_docs = get_number_of_total_docs()
-    n_total_docs_str = format_int(n_total_docs)
+    stats = get_index_stats()
+    n_total_docs_str = format_int(stats.total_docs)
     index_to_doc_count = {
-        index: format_int(count) for index, count in get_indices_and_doc_counts().items()
+        alias: format_int(count) for alias, count in stats.alias_doc_counts.items()
     }
     return flask.render_template(
         "index.html",
@@ -38,10 +63,25 @@ def home():
 
 
 @app.route("/zoek/")
+@conditional(data_validators())
+@microcache
 def search():
     q: str = flask.request.args.get("q", default="", type=str)
+    page = flask.request.args.get("page", default=1, type=int)
+    sort_by = flask.request.args.get("sort", default=None)
+    cursor = flask.request.args.get("cursor", default=None)
+    canonical_args = canonical_search_args(
+        q, flask.request.args.getlist("index"), sort_by=sort_by, page=page, cursor=cursor
+    )
+    # not permanent, so browsers don't keep it when the canonical form changes
+    if list(flask.request.args.items(multi=True)) != canonical_args:
+        return flask.redirect(
+            search_url(q, flask.request.args.getlist("index"), sort_by, page, cursor), code=302
+        )
+    q = normalize_query(q)
+    index_names = [value for key, value in canonical_args if key == "index"]
     doctypes_selection: List[Type[BaseDocument]] = [
-        index_name_to_doctype[index_name] for index_name in flask.request.args.getlist("index")
+        index_name_to_doctype[index_name] for index_name in index_names
     ]
     if not doctypes_selection:
         doctypes_selection = list_doctypes()
@@ -51,66 +91,86 @@ def search():
         for doctype in list_doctypes()
     ]
     cards_per_page = 10
-    page = flask.request.args.get("page", default=1, type=int)
-    searcher = controller.Searcher(
-        q.lower(),
-        start=(page - 1) * cards_per_page,
-        size=cards_per_page,
-        doctypes=doctypes_selection,
-    )
-    sort_by = flask.request.args.get("sort", default=None)
-    searcher.sort(sort_by=sort_by)
-    hits = searcher.get_results()
+    last_from_size_page = controller.get_last_from_size_page(cards_per_page)
+    if cursor is None and page > last_from_size_page:
+        return flask.redirect(search_url(q, index_names, sort_by, last_from_size_page), code=302)
+
+    def run_search(cursor: Optional[str]) -> Tuple[controller.Searcher, List[HitView]]:
+        searcher = controller.Searcher(
+            q,
+            start=(page - 1) * cards_per_page,
+            size=cards_per_page,
+            doctypes=doctypes_selection,
+        )
+        searcher.sort(sort_by=sort_by)
+        # pages are fetched with from/size, only the next page of the last one that can be
+        # continues with a cursor
+        if cursor is None and page == last_from_size_page:
+            cursor = ""
+        if cursor is not None:
+            searcher.use_cursor(cursor)
+        return searcher, searcher.get_results()
+
+    try:
+        searcher, hits = run_search(cursor)
+    except InvalidCursorError:
+        # like an expired cursor of a bookmarked page, show the page with from/size instead
+        if page > last_from_size_page:
+            return flask.redirect(
+                search_url(q, index_names, sort_by, last_from_size_page), code=302
+            )
+        searcher, hits = run_search(None)
     hits_formatted = [format_hit(hit) for hit in hits]
     hits_total = searcher.count()
-    page_range = controller.get_page_range(hits_total, page, cards_per_page)
-    query_string = f"?q={quote(q)}"
-    query_string = add_selected_doctypes_to_query_string(query_string, doctypes_selection)
-    if sort_by:
-        query_string += f"&sort={sort_by}"
-    query_string += "&page="
-
-    if page == 1:
-        suggestions = controller.get_suggestions(searcher.keywords)
-    else:
-        suggestions = {}
+    page_range = [
+        number
+        for number in controller.get_page_range(hits_total, page, cards_per_page)
+        if number <= last_from_size_page
+        or number == page
+        or (number == page + 1 and searcher.next_cursor)
+    ]
+
+    def page_url(number: int) -> str:
+        if number == page + 1 and searcher.next_cursor:
+            return search_url(q, index_names, sort_by, number, searcher.next_cursor)
+        return search_url(q, index_names, sort_by, number)
+
+    suggestions = controller.get_suggestions(searcher.keywords) if page == 1 else {}
     suggestion_urls = {}
     for token, _suggs in suggestions.items():
         for suggestion in _suggs:
             q_new = re.sub(r"\b{}\b".format(token), f"{token} {suggestion}", q)
-            url = f"?q={quote(q_new)}"
-            url = add_selected_doctypes_to_query_string(url, doctypes_selection)
-            suggestion_urls[suggestion] = url
-
-    return flask.render_template(
-        "cards.html",
-        hits=hits_formatted,
-        hits_total=hits_total,
-        q=q,
-        sort_by=sort_by,
-        sort_options=searcher.get_sort_options(),
-        query_string=query_string,
-        page_range=page_range,
-        page=page,
-        suggestions=suggestion_urls,
-        doctypes=doctypes,
-        check_all=check_all,
+            suggestion_urls[suggestion] = search_url(q_new, index_names)
+
+    response = flask.make_response(
+        flask.render_template(
+            "cards.html",
+            hits=hits_formatted,
+            hits_total=hits_total,
+            q=q,
+            sort_by=sort_by,
+            sort_options=searcher.get_sort_options(),
+            page_url=page_url,
+            export_url=lambda export_format: flask.url_for(
+                "export_api", q=q, index=index_names, sort=sort_by, format=export_format
+            ),
+            page_range=page_range,
+            page=page,
+            suggestions=suggestion_urls,
+            doctypes=doctypes,
+            check_all=check_all,
+        )
     )
+    response.headers["Link"] = f'<{search_url(q, index_names, sort_by, page)}>; rel="canonical"'
+    return response
 
 
-def add_selected_doctypes_to_query_string(
-    query_string: str, doctypes_selection: List[Type[BaseDocument]]
-) -> str:
-    for doctype in doctypes_selection:
-        query_string += f"&index={doctype.Index.name}"
-    return query_string
-
-
-def format_hit(doc: BaseDocument) -> dict:
+def format_hit(doc: HitView) -> dict:
     return {
-        "id": doc.meta.id,
-        "score": doc.meta.score,
+        "id": doc.id,
+        "score": doc.score,
         "index": doc.get_index_name_pretty(),
+        "index_name": doc.index_name,
         "title": doc.get_title(),
         "subtitle": doc.get_subtitle(),
         "body_lines": doc.get_body_lines(),
@@ -118,8 +178,12 @@ def format_hit(doc: BaseDocument) -> dict:
 
 
 @app.route("/doc/<int:doc_id>")
+@conditional(data_validators())
+@microcache
 def get_product(doc_id):
-    doc = get_doc(doc_id)
+    doc = get_doc(doc_id, index_name=flask.request.args.get("index"))
+    if doc is None:
+        return flask.abort(404)
     doc_formatted = format_hit(doc)
     return flask.render_template("card.html", hit=doc_formatted)
 
@@ -135,16 +199,18 @@ def browse():
 
 
 @app.route("/namen/")
+@conditional(data_validators(NamesNerDoc.Index.name))
 def names_ner():
     query = flask.request.args.get("q", "").lower().strip()
-    page = int(flask.request.args.get("page", 1))
+    page = max(int(flask.request.args.get("page", 1)), 1)
     return flask.render_template("names_ner.html", query=query, page=page)
 
 
 @app.route("/namen/search/", methods=["GET"])
+@conditional(data_validators(NamesNerDoc.Index.name))
 def search_names_ner():
     query = flask.request.args.get("q", "").lower().strip()
-    page = int(flask.request.args.get("page", 1))
+    page = max(int(flask.request.args.get("page", 1)), 1)
     per_page = 200
     names, n_total_docs = names_ner_search(query=query, page=page, per_page=per_page)
     total_pages = (n_total_docs // per_page) + 1
@@ -159,93 +225,94 @@ def search_names_ner():
 
 
 @app.route("/bronnen/")
+@conditional(data_validators(BronDoc.Index.name))
 def bronnen():
     query = flask.request.args.get("q", "").lower().strip()
-    page = int(flask.request.args.get("page", 1))
-    return flask.render_template("bronnen.html", query=query, page=page)
+    page = max(int(flask.request.args.get("page", 1)), 1)
+    sort = flask.request.args.get("sort", "")
+    return flask.render_template("bronnen.html", query=query, page=page, sort=sort)
 
 
 @app.route("/bronnen/search/", methods=["GET"])
+@conditional(data_validators(BronDoc.Index.name))
 def search_bronnen():
     query = flask.request.args.get("q", "").lower().strip()
-    page = int(flask.request.args.get("page", 1))
+    page = max(int(flask.request.args.get("page", 1)), 1)
     per_page = 200
-    _bronnen, n_total_docs = bronnen_search(query=query, page=page, per_page=per_page)
+    sort_by_count = flask.request.args.get("sort") == "count"
+    _bronnen, n_total_docs = bronnen_search(
+        query=query, page=page, per_page=per_page, sort_by_count=sort_by_count
+    )
     total_pages = (n_total_docs // per_page) + 1
     return flask.jsonify(
         {
             "page": page,
             "per_page": per_page,
             "total_pages": total_pages,
-            "bronnen": _bronnen,
+            "bronnen": [{"bron": bron, "count": count} for bron, count in _bronnen],
         }
     )
 
 
 @app.route("/spelling/")
+@conditional(data_validators(SpellingMistakeCandidateDoc.Index.name))
 def spelling_mistake_candidates():
-    docs = get_all_spelling_mistake_candidates()
-    items = []
-    for doc in sorted(docs, key=lambda d: len(d.word), reverse=True):
-        for candidate, candidate_count in zip(doc.candidates, doc.candidate_counts):
-            items.append(
-                {
-                    "word": doc.word,
-                    "word_count": doc.count,
-                    "candidate": candidate,
-                    "candidate_count": candidate_count,
-                }
-            )
-    return flask.render_template("spelling_mistake_candidates.html", items=items)
+    query = flask.request.args.get("q", "").strip()
+    page = max(flask.request.args.get("page", default=1, type=int), 1)
+    per_page = 100
+    items, n_total = spelling_mistake_candidates_search(query, page=page, per_page=per_page)
+    return flask.render_template(
+        "spelling_mistake_candidates.html",
+        items=items,
+        query=query,
+        page=page,
+        page_range=controller.get_page_range(n_total, page, per_page),
+        page_url=lambda number: f"?q={quote(query)}&page={number}",
+        word_url=lambda word: search_url(f'"{word}"', []),
+    )
 
 
 @app.route("/locaties/")
+@conditional(data_validators(LocationDoc.Index.name))
 def locations():
-    docs = get_all_locations()
-    docs = sorted(docs, key=lambda doc: doc.location)
-    return flask.render_template("locations.html", docs=docs)
+    query = flask.request.args.get("q", "").strip()
+    page = max(flask.request.args.get("page", default=1, type=int), 1)
+    per_page = 200
+    docs, n_total = locations_search(query, page=page, per_page=per_page)
+    return flask.render_template(
+        "locations.html",
+        docs=docs,
+        query=query,
+        page=page,
+        page_range=controller.get_page_range(n_total, page, per_page),
+        page_url=lambda number: f"?q={quote(query)}&page={number}",
+        location_url=lambda location: search_url(
+            f'inhoud:"{location}"', [TransportRegisterHaarlemDoc.Index.name]
+        ),
+    )
 
 
 @app.route("/publicaties/", methods=["GET"])
+@conditional(publication_validators)
 def publicaties():
-    _publicaties = []
-    _categorieen = set()
-    path = "collectiegroesbeek/templates/publicaties"
-    for filename_html in os.listdir(path):
-        if not filename_html.endswith(".html"):
-            continue
-        filename_json = filename_html.replace(".html", ".json")
-        with open(posixpath.join(path, filename_json)) as f:
-            metadata = json.load(f)
-        _publicaties.append(
-            {
-                "publicatie": filename_html.replace(".html", ""),
-                "titel": metadata["titel"],
-                "jaar": metadata["jaar"],
-                "afkomstig_uit": metadata["afkomstig uit"],
-                "omschrijving": metadata["omschrijving"],
-                "categorie": metadata["categorie"],
-            }
-        )
-        _categorieen.add(metadata["categorie"])
-    _publicaties = sorted(_publicaties, key=lambda x: x["jaar"])
+    catalogue = publication_catalogue.get()
     return flask.render_template(
         "publicaties.html",
-        publicaties=_publicaties,
-        categorieen=sorted(_categorieen),
+        publicaties=catalogue.publications,
+        categorieen=catalogue.categories,
     )
 
 
 @app.route("/publicaties/<publicatie>", methods=["GET"])
+@conditional(publication_validators)
 def publicatie_(publicatie: str):
+    publication = publication_catalogue.get().by_name.get(publicatie)
+    if publication is None:
+        return flask.abort(404)
     template_path = "publicaties/" + publicatie + ".html"
-    with open(
-        posixpath.join("collectiegroesbeek/templates/publicaties", publicatie + ".json")
-    ) as f:
-        metadata = json.load(f)
     return flask.render_template(
         "publicatie.html",
         publicatie=publicatie,
         template_path=template_path,
-        metadata=metadata,
+        metadata=publication.metadata,
     )
@@ -0,0 +1,285 @@
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+VOCABULARY_PATH = "vocabulary.pickle"
+FORMAT_VERSION = 1
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_WORD_LENGTH = 3
+MIN_COUNT = 2
+
+
+def tokenize(text: str) -> Iterator[str]:
+    """Return the lowercased words of only letters in the text."""
+    for word in re.split(r"[-,;:.\s]", text):
+        word = word.strip().lower()
+        if word.isalpha():
+            yield word
+
+
+def count_words(texts: Iterable[str]) -> Dict[str, int]:
+    word_counts: Dict[str, int] = {}
+    for text in texts:
+        for word in tokenize(text):
+            word_counts[word] = word_counts.get(word, 0) + 1
+    return word_counts
+
+
+def hash_delete(delete: str) -> int:
+    return zlib.crc32(delete.encode())
+
+
+def get_deletes(word: str, max_distance: int) -> Set[str]:
+    """Return the word and each string made by deleting up to max_distance of its letters."""
+    deletes = {word}
+    edge = {word}
+    for _ in range(max_distance):
+        edge = {w[:i] + w[i + 1 :] for w in edge for i in range(len(w))} - deletes
+        deletes |= edge
+    return deletes
+
+
+def get_char_masks(word: str) -> Dict[str, int]:
+    """Return per letter of the word a bitmask of the positions where it occurs."""
+    masks: Dict[str, int] = {}
+    for position, char in enumerate(word):
+        masks[char] = masks.get(char, 0) | 1 << position
+    return masks
+
+
+def edit_distance(
+    a: str, b: str, max_distance: int, char_masks: Optional[Dict[str, int]] = None
+) -> int:
+    """Return the edit distance with transpositions, or max_distance + 1 if it's larger.
+
+    This is the bit-parallel algorithm of Hyyrö (2003): each column of the distance matrix is
+    kept in the bits of a few integers, so a letter of b costs a handful of integer operations
+    instead of a loop over the letters of a. Pass the char_masks of a to compare a to many
+    words.
+    """
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return too_far
+    if not a:
+        return min(len(b), too_far)
+    if char_masks is None:
+        char_masks = get_char_masks(a)
+    all_bits = (1 << len(a)) - 1
+    last_bit = 1 << (len(a) - 1)
+    vertical_positive, vertical_negative, diagonal_zero, mask_previous = all_bits, 0, 0, 0
+    distance = len(a)
+    for char in b:
+        mask = char_masks.get(char, 0)
+        transposition = ((~diagonal_zero & mask) << 1) & mask_previous
+        diagonal_zero = (
+            ((((mask & vertical_positive) + vertical_positive) ^ vertical_positive) & all_bits)
+            | mask
+            | vertical_negative
+            | transposition
+        )
+        horizontal_positive = vertical_negative | (~(diagonal_zero | vertical_positive) & all_bits)
+        horizontal_negative = diagonal_zero & vertical_positive
+        if horizontal_positive & last_bit:
+            distance += 1
+        elif horizontal_negative & last_bit:
+            distance -= 1
+        horizontal_positive = ((horizontal_positive << 1) | 1) & all_bits
+        horizontal_negative = (horizontal_negative << 1) & all_bits
+        vertical_positive = horizontal_negative | (
+            ~(diagonal_zero | horizontal_positive) & all_bits
+        )
+        vertical_negative = horizontal_positive & diagonal_zero
+        mask_previous = mask
+    return min(distance, too_far)
+
+
+class Vocabulary:
+    """The words of all cards with their counts, to suggest corrections for a query word.
+
+    Suggestions are looked up like SymSpell does: every word is indexed under the strings made
+    by deleting up to `max_edit_distance` letters of its first `prefix_length` letters. A query
+    word looks up its own deletes, which finds all words within that edit distance without
+    comparing to each word. Like the PrefixIndex, the positions of the words are concatenated
+    in one flat array. The deletes themselves are only kept as a sorted array of their crc32,
+    which is a fraction of the memory of the strings. A hash collision only adds a candidate,
+    and every candidate is checked with the edit distance.
+    """
+
+    def __init__(
+        self,
+        word_counts: Mapping[str, int],
+        max_edit_distance: int = MAX_EDIT_DISTANCE,
+        prefix_length: int = PREFIX_LENGTH,
+    ):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.words: List[str] = sorted(word_counts)
+        self.counts = array("I", (word_counts[word] for word in self.words))
+        hash_to_positions: Dict[int, List[int]] = {}
+        for position, word in enumerate(self.words):
+            for delete in get_deletes(word[:prefix_length], max_edit_distance):
+                hash_to_positions.setdefault(hash_delete(delete), []).append(position)
+        self._hashes = array("I", sorted(hash_to_positions))
+        self._offsets = array("I", [0])
+        self._positions = array("I")
+        for delete_hash in self._hashes:
+            self._positions.extend(hash_to_positions[delete_hash])
+            self._offsets.append(len(self._positions))
+
+    @classmethod
+    def from_word_counts(
+        cls,
+        word_counts: Mapping[str, int],
+        min_word_length: int = MIN_WORD_LENGTH,
+        min_count: int = MIN_COUNT,
+    ) -> "Vocabulary":
+        """Keep the words that are long and frequent enough, the rest are likely typos."""
+        return cls(
+            {
+                word: count
+                for word, count in word_counts.items()
+                if len(word) >= min_word_length and count >= min_count
+            }
+        )
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _find_positions(self, delete: str) -> array:
+        delete_hash = hash_delete(delete)
+        index = bisect_left(self._hashes, delete_hash)
+        if index == len(self._hashes) or self._hashes[index] != delete_hash:
+            return array("I")
+        return self._positions[self._offsets[index] : self._offsets[index + 1]]
+
+    def lookup(self, word: str) -> List[Tuple[str, int, int]]:
+        """Return the words within the edit distance as (word, distance, count).
+
+        The closest words come first, and of those the most frequent.
+        """
+        word = word.lower()
+        char_masks = get_char_masks(word)
+        found: Dict[int, int] = {}
+        for delete in get_deletes(word[: self.prefix_length], self.max_edit_distance):
+            for position in self._find_positions(delete):
+                if position not in found:
+                    candidate = self.words[position]
+                    if abs(len(candidate) - len(word)) > self.max_edit_distance:
+                        found[position] = self.max_edit_distance + 1
+                    else:
+                        found[position] = edit_distance(
+                            word, candidate, self.max_edit_distance, char_masks
+                        )
+        results = [
+            (self.words[position], distance, self.counts[position])
+            for position, distance in found.items()
+            if distance <= self.max_edit_distance
+        ]
+        results.sort(key=lambda result: (result[1], -result[2], result[0]))
+        return results
+
+    def suggest(self, word: str, size: int = 5) -> List[str]:
+        """Return up to size other words that the word might have been meant as."""
+        word = word.lower()
+        return [suggestion for suggestion, _, _ in self.lookup(word) if suggestion != word][:size]
+
+    def save(self, path: str):
+        """Write the vocabulary to a file, replacing it at once so readers never see half."""
+        state = {
+            "version": FORMAT_VERSION,
+            "max_edit_distance": self.max_edit_distance,
+            "prefix_length": self.prefix_length,
+            "words": self.words,
+            "counts": self.counts,
+            "hashes": self._hashes,
+            "offsets": self._offsets,
+            "positions": self._positions,
+        }
+        path_tmp = f"{path}.tmp"
+        with open(path_tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path_tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Vocabulary":
+        """Read a vocabulary that was written by `save`, during the ingest."""
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Vocabulary {path} has version {state.get('version')}")
+        vocabulary = cls.__new__(cls)
+        vocabulary.max_edit_distance = state["max_edit_distance"]
+        vocabulary.prefix_length = state["prefix_length"]
+        vocabulary.words = state["words"]
+        vocabulary.counts = state["counts"]
+        vocabulary._hashes = state["hashes"]
+        vocabulary._offsets = state["offsets"]
+        vocabulary._positions = state["positions"]
+        return vocabulary
+
+
+class VocabularyFile:
+    """The vocabulary that the ingest wrote, loaded once per process.
+
+    At most once every `check_interval` seconds the modification time of the file is compared,
+    and it is loaded again if the ingest wrote a new one. Without a file there are no
+    suggestions.
+    """
+
+    def __init__(
+        self,
+        path: str = VOCABULARY_PATH,
+        check_interval: float = 60.0,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.path = path
+        self.check_interval = check_interval
+        self.timer = timer
+        self._vocabulary: Optional[Vocabulary] = None
+        self._mtime_ns: Optional[int] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[Vocabulary]:
+        with self._lock:
+            now = self.timer()
+            if self._checked_at is None or now - self._checked_at > self.check_interval:
+                self._check()
+                self._checked_at = now
+            return self._vocabulary
+
+    def _check(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            if self._checked_at is None:
+                logger.warning(f"No vocabulary at {self.path}, there will be no suggestions")
+            return
+        if mtime_ns != self._mtime_ns:
+            start = time.perf_counter()
+            try:
+                self._vocabulary = Vocabulary.load(self.path)
+            except (OSError, ValueError, pickle.UnpicklingError):
+                logger.exception(f"Could not load the vocabulary at {self.path}")
+                return
+            self._mtime_ns = mtime_ns
+            duration = time.perf_counter() - start
+            logger.info(f"Loaded {len(self._vocabulary)} words from {self.path} in {duration:.2f}s")
+
+
+vocabulary_file = VocabularyFile()
+
+
+def setup_vocabulary(config: Mapping[str, Optional[str]]):
+    """Use the vocabulary file from the config, if it names one."""
+    vocabulary_file.path = config.get("vocabulary_path") or VOCABULARY_PATH
@@ -1,22 +1,65 @@
 import logging
+import os
+import re
+import statistics
+import threading
 import time
-from typing import Dict, Optional, Type
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Type
 
 from dotenv import dotenv_values
-from elasticsearch.helpers import bulk
+from elasticsearch import TransportError
+from elasticsearch.helpers import BulkIndexError, expand_action
 from elasticsearch_dsl import Document, Index
 from elasticsearch_dsl.connections import connections
 
+from .warmup import Warmer
+
 logger = logging.getLogger(__name__)
 
+# seconds to wait before deleting the old indices, for the searches that are still running
+RETIRE_DELAY = 10.0
+# key in the _meta of an index's mapping, set once all its documents were added
+BUILD_FINISHED_META = "build_finished"
+
+# a bulk request is closed at this size, far below the http.max_content_length of 100mb
+MAX_BATCH_BYTES = 5 * 1024 * 1024
+MAX_IN_FLIGHT = 4
+BULK_TIMEOUT = 60
+# backoff in seconds for the documents that Elasticsearch rejected with 429 Too Many Requests
+INITIAL_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+MAX_RETRIES = 8
+
 
 def setup_es_connection():
-    connections.create_connection(hosts=[dotenv_values(".env")["elasticsearch_host"]])
+    """Connect to Elasticsearch, gzipping the request bodies if `elasticsearch_http_compress=1`."""
+    config = dotenv_values(".env")
+    connections.create_connection(
+        hosts=[config["elasticsearch_host"]],
+        http_compress=config.get("elasticsearch_http_compress") == "1",
+    )
     assert connections.get_connection().ping()
 
 
 class IndexMover:
-    def __init__(self, doctype: Type[Document]):
+    """Build a doctype's data in a new index `<alias>_<epoch>`, then move the alias to it.
+
+    With a `warmer`, the new index is warmed up before the alias moves, and again through the
+    alias after it moved. Only then is the old index deleted, so it keeps serving the searches
+    that are still running on it. Pass the name of an index that was built before as
+    `new_name` to only move the alias to it.
+    """
+
+    def __init__(
+        self,
+        doctype: Type[Document],
+        warmer: Optional[Warmer] = None,
+        new_name: Optional[str] = None,
+    ):
+        self.doctype = doctype
+        self.warmer = warmer
         self.alias = doctype.Index.name
         es_index: Index = doctype.Index()
         if es_index.exists():
@@ -25,26 +68,201 @@ class IndexMover:
         else:
             self.old_es_index = None
             self.old_name = None
-        self.new_name = "{}_{:.0f}".format(self.alias, time.time())
+        if new_name is None:
+            new_name = "{}_{:.0f}".format(self.alias, time.time())
+            doctype.init(index=new_name)
+        self.new_name = new_name
         self.new_es_index = Index(name=self.new_name)
-        doctype.init(index=self.new_name)
 
-    def move_alias_to_new(self):
-        if self.old_es_index:
-            self.old_es_index.delete_alias(name=self.alias)
-        self.new_es_index.put_alias(name=self.alias)
-        if self.old_es_index:
-            self.old_es_index.delete()
+    def get_alias_actions(self) -> List[dict]:
+        """Return the actions of an `_aliases` update that move the alias to the new index."""
+        actions = []
+        if self.old_name is not None:
+            actions.append({"remove": {"index": self.old_name, "alias": self.alias}})
+        actions.append({"add": {"index": self.new_name, "alias": self.alias}})
+        return actions
+
+    def mark_finished(self):
+        """Record in the new index that all its documents were added, see `find_built_indices`."""
+        self.new_es_index.put_mapping(body={"_meta": {BUILD_FINISHED_META: int(time.time())}})
+
+    def warm_up(self, stage: str):
+        """Warm up the new index, logging instead of raising when that fails."""
+        if self.warmer is None:
+            return
+        try:
+            if stage == "before swap":
+                self.new_es_index.refresh()
+                self.warmer.warm_up(self.doctype, self.new_name, stage=stage)
+            else:
+                self.warmer.warm_up(self.doctype, self.alias, stage=stage)
+        except Exception:
+            logger.exception("Warm-up %s %s failed", stage, self.new_name)
+
+    def move_alias_to_new(self) -> Optional[threading.Thread]:
+        return swap_aliases([self])
+
+
+def swap_aliases(
+    movers: Sequence[IndexMover], retire_delay: float = RETIRE_DELAY
+) -> Optional[threading.Thread]:
+    """Move the aliases of all movers to their new index at once, then retire the old ones.
+
+    All aliases move in one `_aliases` update, which Elasticsearch applies atomically: a search
+    sees either all the old indices or all the new ones, and never a missing alias. The web
+    workers notice the new indices on their own, when their `DataGeneration` next asks
+    Elasticsearch, which is at most 30 seconds later. The old indices are deleted in a
+    background thread after `retire_delay`, see `retire_indices`. A failing warm-up doesn't
+    stop either.
+    """
+    if not movers:
+        return None
+    for mover in movers:
+        mover.warm_up("before swap")
+    es = connections.get_connection()
+    actions = [action for mover in movers for action in mover.get_alias_actions()]
+    es.indices.update_aliases(body={"actions": actions})
+    logger.info("Moved the aliases to %s", ", ".join(mover.new_name for mover in movers))
+    for mover in movers:
+        mover.warm_up("after swap")
+    return retire_indices(
+        [mover.old_name for mover in movers if mover.old_name is not None], delay=retire_delay
+    )
+
+
+def retire_indices(names: Sequence[str], delay: float = RETIRE_DELAY) -> Optional[threading.Thread]:
+    """Delete the indices in a background thread, after `delay` seconds.
+
+    The delay gives searches that started on the old indices time to finish. The thread isn't
+    a daemon, so the script waits for it before it exits.
+    """
+    if not names:
+        return None
+
+    def delete():
+        time.sleep(delay)
+        es = connections.get_connection()
+        for name in names:
+            es.indices.delete(index=name, ignore_unavailable=True)
+            logger.info("Deleted the old index %s", name)
+
+    thread = threading.Thread(target=delete, name="retire-indices")
+    thread.start()
+    return thread
+
+
+@dataclass(frozen=True)
+class TimestampedIndex:
+    epoch: int
+    name: str
+    has_alias: bool
+    is_finished: bool
+
+
+def get_timestamped_indices(alias: str) -> List[TimestampedIndex]:
+    """Return the indices `<alias>_<epoch>`, oldest first."""
+    es = connections.get_connection()
+    pattern = re.compile(re.escape(alias) + r"_(\d{10})")
+    indices = es.indices.get_alias(index=f"{alias}_*", ignore_unavailable=True)
+    mappings = es.indices.get_mapping(index=f"{alias}_*", ignore_unavailable=True)
+    result = []
+    for name, info in indices.items():
+        match = pattern.fullmatch(name)
+        if match is None:
+            continue
+        meta = mappings.get(name, {}).get("mappings", {}).get("_meta", {})
+        result.append(
+            TimestampedIndex(
+                epoch=int(match.group(1)),
+                name=name,
+                has_alias=alias in info.get("aliases", {}),
+                is_finished=BUILD_FINISHED_META in meta,
+            )
+        )
+    return sorted(result, key=lambda index: index.epoch)
+
+
+def find_built_indices(doctypes: Iterable[Type[Document]]) -> Dict[Type[Document], str]:
+    """Return per doctype the newest finished index that is newer than its alias points to.
+
+    Those are the indices that were built with the swap deferred. An index only counts as
+    finished once `DocProcessor.finalize` marked it, so one of a failed run is never promoted.
+    """
+    built = {}
+    for doctype in doctypes:
+        indices = get_timestamped_indices(doctype.Index.name)
+        current_epoch = max((index.epoch for index in indices if index.has_alias), default=0)
+        finished = [index for index in indices if index.is_finished]
+        if finished and finished[-1].epoch > current_epoch:
+            built[doctype] = finished[-1].name
+    return built
+
+
+def find_leftover_indices(
+    doctypes: Iterable[Type[Document]], keep: Iterable[str] = ()
+) -> List[str]:
+    """Return the indices of the doctypes that no alias points to, except those to keep.
+
+    Those are left by runs that failed, or were built but replaced by a newer build before
+    their aliases moved. Only delete them while no ingest is running, or the index it is
+    building is deleted too.
+    """
+    keep = set(keep)
+    return [
+        index.name
+        for doctype in doctypes
+        for index in get_timestamped_indices(doctype.Index.name)
+        if not index.has_alias and index.name not in keep
+    ]
 
 
 class DocProcessor:
-    def __init__(self, batch_size=500, dryrun: bool = False):
+    """Bulk add documents to new indices, and move the aliases to them in `finalize`.
+
+    A batch is sent when it holds `batch_size` documents or `max_batch_bytes` of request body,
+    whichever comes first. Up to `max_in_flight` bulk requests run at the same time in a thread
+    pool, adding more documents waits while that many are running. Documents that Elasticsearch
+    rejects with 429 are sent again after a backoff. Documents that fail otherwise are kept in
+    `failed`, and `finalize` raises a BulkIndexError with them before any alias moves.
+
+    With `defer_swap` the new indices are only built, and scripts/swap_aliases.py moves the
+    aliases of all of them at once later. It defaults to the DEFER_ALIAS_SWAP environment
+    variable, which scripts/ingest_all.sh sets.
+    """
+
+    def __init__(
+        self,
+        batch_size=500,
+        dryrun: bool = False,
+        warm_up: bool = True,
+        defer_swap: Optional[bool] = None,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        max_in_flight: int = MAX_IN_FLIGHT,
+    ):
         self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
         self.dryrun = dryrun
+        if defer_swap is None:
+            defer_swap = os.environ.get("DEFER_ALIAS_SWAP") == "1"
+        self.defer_swap = defer_swap
+        self.warmer = Warmer() if warm_up and not dryrun and not defer_swap else None
         self.client = connections.get_connection()
+        self.serializer = self.client.transport.serializer
+        self.initial_backoff = INITIAL_BACKOFF
+        self.max_backoff = MAX_BACKOFF
+        self.max_retries = MAX_RETRIES
         self._movers: Dict[str, IndexMover] = {}
-        self._items: list[dict] = []
+        self._items: List[bytes] = []
+        self._items_bytes = 0
+        self._executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix="bulk")
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
         self._count = 0
+        self._bytes_sent = 0
+        self._retried = 0
+        self.latencies: List[float] = []
+        self.failed: List[dict] = []
 
     def register_index(self, doctype: Type[Document]):
         """Mark an index as being updated, creating an IndexMover instance."""
@@ -52,28 +270,146 @@ class DocProcessor:
         if key in self._movers:
             return
         if not self.dryrun:
-            self._movers[key] = IndexMover(doctype)
+            self._movers[key] = IndexMover(doctype, warmer=self.warmer)
 
     def add(self, doc: Document):
-        d = doc.to_dict(include_meta=True)
+        self.add_dict(doc.to_dict(include_meta=True))
+
+    def add_dict(self, d: dict):
+        """Add a document as from `to_dict(include_meta=True)`, with the alias as _index."""
         if not self.dryrun:
             d["_index"] = self._movers[d["_index"]].new_name
-        self._items.append(d)
-        if len(self._items) > self.batch_size:
+        action, source = expand_action(d)
+        item = f"{self.serializer.dumps(action)}\n{self.serializer.dumps(source)}\n".encode()
+        if self._items and (
+            len(self._items) >= self.batch_size
+            or self._items_bytes + len(item) > self.max_batch_bytes
+        ):
             self.flush()
+        self._items.append(item)
+        self._items_bytes += len(item)
 
     def flush(self):
-        if len(self._items) > 0 and not self.dryrun:
-            bulk(self.client, self._items)
-            self._count += len(self._items)
+        """Send the batch in the background, first waiting for a free slot."""
+        items = self._items
         self._items = []
+        self._items_bytes = 0
+        if not items or self.dryrun:
+            return
+        self._check_batches()
+        self._in_flight.acquire()
+        future = self._executor.submit(self._send_batch, items)
+        future.add_done_callback(lambda _: self._in_flight.release())
+        self._futures.append(future)
+
+    def _check_batches(self):
+        """Raise the exception of a batch that couldn't be sent, and forget the finished ones."""
+        running = []
+        for future in self._futures:
+            if future.done():
+                future.result()
+            else:
+                running.append(future)
+        self._futures = running
+
+    def _send_batch(self, items: List[bytes]):
+        """Send one bulk request, and send the documents that were rejected with 429 again."""
+        backoff = self.initial_backoff
+        for attempt in range(self.max_retries + 1):
+            body = b"".join(items)
+            start = time.perf_counter()
+            try:
+                response = self.client.bulk(body=body, request_timeout=BULK_TIMEOUT)
+            except TransportError as e:
+                if e.status_code != 429 or attempt == self.max_retries:
+                    raise
+                rejected = items
+            else:
+                rejected = self._process_response(items, response, retry=attempt < self.max_retries)
+            latency = time.perf_counter() - start
+            with self._lock:
+                self.latencies.append(latency)
+                self._bytes_sent += len(body)
+            logger.debug(
+                "Bulk request of %d docs, %d bytes took %.0fms",
+                len(items),
+                len(body),
+                latency * 1000,
+            )
+            if not rejected:
+                return
+            with self._lock:
+                self._retried += len(rejected)
+            logger.warning("%d docs were rejected with 429, retry in %.1fs", len(rejected), backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+            items = rejected
+
+    def _process_response(self, items: List[bytes], response: dict, retry: bool) -> List[bytes]:
+        """Count the indexed documents, keep the failed ones, and return those to retry."""
+        if not response["errors"]:
+            with self._lock:
+                self._count += len(items)
+            return []
+        rejected = []
+        failed = []
+        for item, result in zip(items, response["items"]):
+            info = next(iter(result.values()))
+            status = info.get("status", 500)
+            if 200 <= status < 300:
+                continue
+            if status == 429 and retry:
+                rejected.append(item)
+            else:
+                failed.append(
+                    {
+                        "index": info.get("_index"),
+                        "id": info.get("_id"),
+                        "status": status,
+                        "error": info.get("error"),
+                    }
+                )
+        if failed:
+            logger.error("%d docs failed in a bulk request, the first: %s", len(failed), failed[0])
+        with self._lock:
+            self._count += len(items) - len(rejected) - len(failed)
+            self.failed += failed
+        return rejected
+
+    def _wait_for_batches(self):
+        self._executor.shutdown(wait=True)
+        self._check_batches()
+        if self.latencies:
+            logger.info(
+                "Sent %d bulk requests, %.1fMB, latency median %.0fms max %.0fms, %d docs retried",
+                len(self.latencies),
+                self._bytes_sent / 1024 / 1024,
+                statistics.median(self.latencies) * 1000,
+                max(self.latencies) * 1000,
+                self._retried,
+            )
+
+    def finalize(self) -> Optional[threading.Thread]:
+        """Flush, and move the aliases of all registered indices to their new index at once.
 
-    def finalize(self):
+        Return the thread that deletes the old indices, if any. If documents failed to index, a
+        BulkIndexError is raised instead and the aliases stay where they are. Otherwise the new
+        indices are marked as finished first, see `IndexMover.mark_finished`.
+        """
         self.flush()
+        self._wait_for_batches()
+        if self.failed:
+            raise BulkIndexError(f"{len(self.failed)} document(s) failed to index", self.failed)
         for mover in self._movers.values():
-            mover.move_alias_to_new()
+            mover.mark_finished()
         logger.info(
             "Pushed %d docs to %s",
             self._count,
             ", ".join(x.new_name for x in self._movers.values()),
         )
+        if self.defer_swap:
+            for mover in self._movers.values():
+                mover.new_es_index.refresh()
+            logger.info("Deferred moving the aliases, run scripts/swap_aliases.py to do that")
+            return None
+        return swap_aliases(list(self._movers.values()))
@@ -0,0 +1,91 @@
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Type
+
+from dotenv import dotenv_values
+from elasticsearch_dsl import Document, Search
+from elasticsearch_dsl.connections import connections
+
+from collectiegroesbeek.controller import Searcher
+from collectiegroesbeek.model import BaseDocument, index_name_to_doctype
+
+logger = logging.getLogger(__name__)
+
+WARMUP_QUERIES_PATH = os.path.join(os.path.dirname(__file__), "warmup_queries.txt")
+BROWSE_PAGE_SIZE = 10
+
+
+def load_warmup_queries(path: Optional[str] = None) -> List[str]:
+    """Read the queries to replay, one per line, from `warmup_queries_path` in the .env.
+
+    Without that setting the queries shipped in ingest/warmup_queries.txt are used. Empty lines
+    and lines starting with # are skipped.
+    """
+    if path is None:
+        path = dotenv_values(".env").get("warmup_queries_path") or WARMUP_QUERIES_PATH
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def get_warmup_searches(doctype: Type[Document], queries: Sequence[str]) -> Dict[str, List[Search]]:
+    """Return the searches the website does most, per kind, for one doctype.
+
+    The searches are on the alias, point them at another index with `.index()`.
+    """
+    count = Search(index=doctype.Index.name).extra(size=0, track_total_hits=True)
+    searches: Dict[str, List[Search]] = {"counts": [count], "queries": [], "browse": []}
+    if doctype.Index.name not in index_name_to_doctype:
+        return searches
+    assert issubclass(doctype, BaseDocument)
+    for q in queries:
+        searches["queries"].append(Searcher(q, start=0, size=10, doctypes=[doctype]).s)
+    columns = doctype.get_columns()
+    browse = doctype.search().source(columns).extra(from_=0, size=BROWSE_PAGE_SIZE)
+    for column in columns:
+        for order in ["asc", "desc"]:
+            sort_field = doctype.get_sort_field(column)
+            searches["browse"].append(browse.sort({sort_field: {"order": order}}))
+    return searches
+
+
+class Warmer:
+    """Replay the common searches against an index, so its caches are warm for visitors."""
+
+    def __init__(self, queries: Optional[Sequence[str]] = None):
+        self.queries = list(queries) if queries is not None else load_warmup_queries()
+
+    def warm_up(self, doctype: Type[Document], index: str, stage: str) -> Dict[str, float]:
+        """Run the searches on the index, and log and return the time per kind in seconds.
+
+        A search that fails is logged and skipped, warming up is only worth it, not needed.
+        """
+        es = connections.get_connection()
+        timings: Dict[str, float] = {}
+        start_all = time.perf_counter()
+        # the home page asks for the document counts like this
+        try:
+            es.cat.indices(index=index, format="json")
+        except Exception:
+            logger.exception("Warm-up %s %s: the document counts failed", stage, index)
+        for kind, searches in get_warmup_searches(doctype, self.queries).items():
+            start = time.perf_counter()
+            for s in searches:
+                try:
+                    s.index().index(index).execute()
+                except Exception:
+                    logger.exception("Warm-up %s %s: a %s search failed", stage, index, kind)
+            timings[kind] = time.perf_counter() - start
+            if searches:
+                logger.info(
+                    "Warm-up %s %s: %d %s searches in %.2fs",
+                    stage,
+                    index,
+                    len(searches),
+                    kind,
+                    timings[kind],
+                )
+        timings["total"] = time.perf_counter() - start_all
+        logger.info("Warm-up %s %s took %.2fs", stage, index, timings["total"])
+        return timings
@@ -1,8 +1,12 @@
 import argparse
+import collections
+import contextlib
 import csv
+import multiprocessing
 import os
 import re
-from typing import Optional, Type
+from multiprocessing.pool import AsyncResult, Pool
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple, Type
 
 import tqdm
 
@@ -22,27 +26,70 @@ def filename_to_doctype(filename: str) -> Type[BaseDocument]:
         raise KeyError(f"Unknown index number {index_number}, filename {filename}")
 
 
-def run(path, doctype_name: Optional[str], dryrun: bool):
-    processor = DocProcessor(dryrun=dryrun)
-    filenames = sorted(filename for filename in os.listdir(path) if filename.endswith(".csv"))
-    pbar = tqdm.tqdm(filenames)
-    for filename in pbar:
-        pbar.set_postfix(filename=filename)
+def list_files(path: str, doctype_name: Optional[str]) -> List[Tuple[str, Type[BaseDocument]]]:
+    """Return the csv files in the folder with their doctype, limited to one doctype if given."""
+    files = []
+    for filename in sorted(filename for filename in os.listdir(path) if filename.endswith(".csv")):
         doctype = filename_to_doctype(filename)
         if doctype_name and doctype.__name__ != doctype_name:
             continue
+        files.append((os.path.join(path, filename), doctype))
+    return files
+
+
+def parse_file(file: Tuple[str, Type[BaseDocument]]) -> List[dict]:
+    """Return the documents in a csv file, as the dicts to send to Elasticsearch."""
+    filepath, doctype = file
+    docs = []
+    with open(filepath, encoding="utf-8") as f:
+        csvreader = csv.reader(f)
+        next(csvreader)  # skip first line
+        for line in csvreader:
+            if not line:
+                continue
+            card = doctype.from_csv_line(line)
+            if card is None:
+                continue
+            docs.append(card.to_dict(include_meta=True))
+    return docs
+
+
+def parse_files_in_pool(
+    pool: Pool, files: List[Tuple[str, Type[BaseDocument]]], ahead: int
+) -> Iterator[List[dict]]:
+    """Parse the files in the pool and return their documents in the order of the files.
+
+    At most `ahead` files are handed to the pool before their documents are taken, so parsed
+    files don't pile up in memory when sending them to Elasticsearch is the slower part.
+    """
+    pending: Deque[AsyncResult] = collections.deque()
+    for file in files:
+        if len(pending) >= ahead:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(parse_file, (file,)))
+    while pending:
+        yield pending.popleft().get()
+
+
+def run(path, doctype_name: Optional[str], dryrun: bool, workers: int = 1):
+    """Ingest the csv files, parsed in this process or in a pool of `workers` processes.
+
+    With a pool, each worker parses whole files and sends back their documents as dicts, and
+    this process sends them to Elasticsearch as they come in, see `parse_files_in_pool`.
+    """
+    processor = DocProcessor(dryrun=dryrun)
+    files = list_files(path, doctype_name)
+    for _, doctype in files:
         processor.register_index(doctype)
-        filepath = os.path.join(path, filename)
-        with open(filepath, encoding="utf-8") as f:
-            csvreader = csv.reader(f)
-            next(csvreader)  # skip first line
-            for line in csvreader:
-                if not line:
-                    continue
-                card = doctype.from_csv_line(line)
-                if card is None:
-                    continue
-                processor.add(card)
+    with contextlib.ExitStack() as stack:
+        if workers > 1:
+            pool = stack.enter_context(multiprocessing.Pool(workers))
+            results: Iterable[List[dict]] = parse_files_in_pool(pool, files, ahead=workers)
+        else:
+            results = map(parse_file, files)
+        for docs in tqdm.tqdm(results, total=len(files)):
+            for doc in docs:
+                processor.add_dict(doc)
     processor.finalize()
 
 
@@ -55,5 +102,13 @@ if __name__ == "__main__":
     )
     parser.add_argument("--doctype", required=False, help="Limit ingestion to this index only")
     parser.add_argument("--dryrun", action="store_true", help="Don't actually ingest")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of processes that parse the files."
+    )
     options = parser.parse_args()
-    run(path=options.path, doctype_name=options.doctype, dryrun=options.dryrun)
+    run(
+        path=options.path,
+        doctype_name=options.doctype,
+        dryrun=options.dryrun,
+        workers=options.workers,
+    )
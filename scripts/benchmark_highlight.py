@@ -0,0 +1,68 @@
+"""Compare the time Elasticsearch takes for searches with different highlighting.
+
+For each query the search runs without highlighting, with highlighting of all fields (as it
+used to be) and with highlighting of only the queried fields (as it is now). The difference
+with the run without highlighting is the time spent highlighting. Run it before and after
+reindexing with `index_options="offsets"` to see the effect of the stored offsets.
+"""
+
+import argparse
+import statistics
+from typing import Dict, List
+
+from collectiegroesbeek.connection import get_client
+from collectiegroesbeek.controller import Searcher
+from collectiegroesbeek.model import list_doctypes
+from ingest import logging_setup
+from ingest.elasticsearch_utils import setup_es_connection
+
+QUERIES = [
+    "leiden",
+    "jan pietersz",
+    "naam:altena",
+    '"heer van"',
+    "haarlem 1500-1600",
+    "bron:ra inhoud:koop",
+]
+
+
+def get_variants(searcher: Searcher) -> Dict[str, dict]:
+    """Return the request bodies to compare."""
+    body = searcher.s.to_dict()
+    without = {key: value for key, value in body.items() if key != "highlight"}
+    return {
+        "none": without,
+        "all fields": {**without, "highlight": {"fields": {"*": {"number_of_fragments": 0}}}},
+        "queried fields": body,
+    }
+
+
+def measure(index: List[str], body: dict, repeat: int) -> float:
+    """Return the median time in ms that Elasticsearch reports for the search."""
+    es = get_client()
+    timings = [
+        es.search(index=index, body=body, request_cache=False)["took"] for _ in range(repeat)
+    ]
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("queries", nargs="*", default=QUERIES)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--size", type=int, default=10)
+    args = parser.parse_args()
+
+    logging_setup()
+    setup_es_connection()
+
+    print(f"{'query':<25}" + "".join(f"{name:>16}" for name in ["none", "all", "queried"]))
+    for q in args.queries:
+        searcher = Searcher(q, start=0, size=args.size, doctypes=list_doctypes())
+        index = list(searcher.selection.index_names)
+        timings = [measure(index, body, args.repeat) for body in get_variants(searcher).values()]
+        print(f"{q:<25}" + "".join(f"{timing:>14.1f}ms" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
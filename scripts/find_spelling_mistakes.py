@@ -1,11 +1,12 @@
 import logging
-import re
 import string
 from collections import defaultdict
 
+from dotenv import dotenv_values
 from tqdm import tqdm
 
 from collectiegroesbeek.model import SpellingMistakeCandidateDoc
+from collectiegroesbeek.vocabulary import VOCABULARY_PATH, Vocabulary, count_words
 from ingest import logging_setup
 from ingest.dataloader import iter_csv_file_items, iter_csv_files
 from ingest.elasticsearch_utils import DocProcessor, setup_es_connection
@@ -19,21 +20,19 @@ MISTAKE_MAX_COUNT = 5
 
 
 def load_data() -> dict[str, int]:
-    words: dict[str, int] = defaultdict(lambda: 0)
-    for filepath, filename in iter_csv_files():
-        for item in iter_csv_file_items(filepath=filepath):
-            for text in item.values():
-                # split on any of the characters
-                for word in re.split(r"[-,;:.\s]", text):
-                    word = word.strip().lower()
-                    if word.isalpha() and len(word) > MIN_WORD_LENGTH:
-                        words[word] += 1
-    return words
+    return count_words(
+        text
+        for filepath, filename in iter_csv_files()
+        for item in iter_csv_file_items(filepath=filepath)
+        for text in item.values()
+    )
 
 
 def find_mistakes(words: dict[str, int]) -> dict[str, list[str]]:
     errors: dict[str, list[str]] = {}
     for word, count in tqdm(words.items(), desc="find mistakes", total=len(words)):
+        if len(word) <= MIN_WORD_LENGTH:
+            continue
         candidates = find_edit_distance_1(word=word, all_words=words)
         if not candidates:
             continue
@@ -83,11 +82,19 @@ def store_in_elasticsearch(errors: dict[str, list[str]], word_counts: dict[str,
     processor.finalize()
 
 
+def store_vocabulary(word_counts: dict[str, int], path: str):
+    """Write the vocabulary that the webapp uses for its spelling suggestions."""
+    vocabulary = Vocabulary.from_word_counts(word_counts)
+    vocabulary.save(path)
+    logger.info(f"Stored a vocabulary of {len(vocabulary)} words in {path}")
+
+
 def main():
     logging_setup()
     setup_es_connection()
 
     data = load_data()
+    store_vocabulary(data, path=dotenv_values(".env").get("vocabulary_path") or VOCABULARY_PATH)
     errors = find_mistakes(words=data)
     errors = filter_mistakes(errors=errors, word_counts=data)
     store_in_elasticsearch(errors=errors, word_counts=data)
@@ -1,10 +1,8 @@
 import logging
 from collections import defaultdict
 
-from elasticsearch_dsl import Index
 from tqdm import tqdm
 
-from collectiegroesbeek.controller import get_index_from_alias
 from collectiegroesbeek.model import BronDoc
 from ingest import logging_setup
 from ingest.bronnen import split_multibron
@@ -52,11 +50,6 @@ def store_in_elasticsearch(bronnen: dict[str, int]):
         processor.add(doc)
     processor.finalize()
 
-    if len(bronnen) > 10_000:
-        index = Index(get_index_from_alias(BronDoc.Index.name))
-        index.settings(max_result_window=int(len(bronnen) * 1.1))
-        index.save()
-
 
 def main():
     logging_setup()
@@ -1,9 +1,14 @@
 #!/bin/bash
+# stop at the first failure, so the aliases never move to an incomplete set of indices
+set -e
 
 source .venv/bin/activate
 
+# build all new indices first, and move the aliases to them together at the end
+export DEFER_ALIAS_SWAP=1
+
 echo "Running add_documents.py"
-PYTHONPATH=. python scripts/add_documents.py
+PYTHONPATH=. python scripts/add_documents.py --workers "$(nproc)"
 
 echo "Running find_spelling_mistakes.py"
 PYTHONPATH=. python scripts/find_spelling_mistakes.py
@@ -17,4 +22,7 @@ PYTHONPATH=. python scripts/generate_locations.py
 echo "Running ner_spacy.py"
 PYTHONPATH=. python scripts/ner_spacy.py
 
+echo "Running swap_aliases.py"
+DEFER_ALIAS_SWAP=0 PYTHONPATH=. python scripts/swap_aliases.py
+
 echo "All scripts completed"
@@ -2,10 +2,8 @@ import logging
 import re
 
 import spacy
-from elasticsearch_dsl import Index
 from tqdm import tqdm
 
-from collectiegroesbeek.controller import get_index_from_alias
 from collectiegroesbeek.model import NamesNerDoc
 from ingest import logging_setup
 from ingest.dataloader import iter_csv_file_items, iter_csv_files
@@ -120,10 +118,6 @@ def store_in_elasticsearch(names: list[str]):
         processor.add(doc)
     processor.finalize()
 
-    index = Index(get_index_from_alias(NamesNerDoc.Index.name))
-    index.settings(max_result_window=len(names))
-    index.save()
-
 
 def main():
     logging_setup()
@@ -0,0 +1,59 @@
+"""Move the aliases to the indices that were built with DEFER_ALIAS_SWAP=1, all at once.
+
+scripts/ingest_all.sh builds the card indices and the derived indices with the swap deferred,
+and runs this last. Then the website switches from one complete generation of the data to
+the next in one step, instead of index by index. Only indices of which the build finished
+are used. The indices that no alias points to afterwards, like those of a failed run, are
+deleted.
+"""
+
+import argparse
+import logging
+
+from collectiegroesbeek.model import (
+    BronDoc,
+    LocationDoc,
+    NamesNerDoc,
+    SpellingMistakeCandidateDoc,
+    list_doctypes,
+)
+from ingest import logging_setup
+from ingest.elasticsearch_utils import (
+    IndexMover,
+    find_built_indices,
+    find_leftover_indices,
+    retire_indices,
+    setup_es_connection,
+    swap_aliases,
+)
+from ingest.warmup import Warmer
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--no-warm-up", action="store_true", help="Don't warm up the indices")
+    options = parser.parse_args()
+
+    logging_setup()
+    setup_es_connection()
+
+    doctypes = list_doctypes() + [NamesNerDoc, BronDoc, LocationDoc, SpellingMistakeCandidateDoc]
+    built = find_built_indices(doctypes)
+    leftovers = find_leftover_indices(doctypes, keep=built.values())
+    if leftovers:
+        logger.info("Deleting the unfinished or replaced indices %s", ", ".join(leftovers))
+        retire_indices(leftovers, delay=0)
+    if not built:
+        logger.info("There are no new indices to move the aliases to")
+        return
+    warmer = None if options.no_warm_up else Warmer()
+    movers = [
+        IndexMover(doctype, warmer=warmer, new_name=new_name) for doctype, new_name in built.items()
+    ]
+    swap_aliases(movers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import importlib.util
+import os
+import sys
+from types import SimpleNamespace
+
+from collectiegroesbeek.model import CardNameDoc, VoornamenDoc
+
+# the scripts aren't a package, load the one to test by its path
+_spec = importlib.util.spec_from_file_location(
+    "add_documents",
+    os.path.join(os.path.dirname(__file__), os.pardir, "scripts", "add_documents.py"),
+)
+assert _spec is not None and _spec.loader is not None
+add_documents = importlib.util.module_from_spec(_spec)
+sys.modules["add_documents"] = add_documents
+_spec.loader.exec_module(add_documents)
+
+ACHTERNAMEN_CSV = """id,datum,naam,inhoud,bron,getuigen,bijzonderheden
+1,1650,Altena,"Jan van Altena, heer van Leiden",Arch Leiden,,
+2,1651,Brederode,,,,
+
+3,,,,,,
+,1652,Cats,,,,
+"""
+VOORNAMEN_CSV = """id,datum,voornaam,patroniem,inhoud,bron,getuigen,bijzonderheden
+7,1513,Jan,Pietersz,,Leiden,,
+8,1514,Piet,Jansz,,,,
+"""
+
+
+def write_files(path) -> str:
+    (path / "Coll Gr 1 achternamen.csv").write_text(ACHTERNAMEN_CSV, encoding="utf-8")
+    (path / "Coll Gr 2 voornamen.csv").write_text(VOORNAMEN_CSV, encoding="utf-8")
+    (path / "notities.txt").write_text("geen csv", encoding="utf-8")
+    return str(path)
+
+
+def test_parse_file(tmp_path):
+    path = write_files(tmp_path)
+    docs = add_documents.parse_file((os.path.join(path, "Coll Gr 1 achternamen.csv"), CardNameDoc))
+    # the empty line, the card with only an id and the card without id are skipped
+    assert [doc["_id"] for doc in docs] == [1, 2]
+    assert docs[0]["_index"] == "achternamen"
+    assert docs[0]["_source"]["naam"] == "Altena"
+    assert docs[0]["_source"]["inhoud"] == "Jan van Altena, heer van Leiden"
+
+
+def test_list_files(tmp_path):
+    path = write_files(tmp_path)
+    assert [doctype for _, doctype in add_documents.list_files(path, None)] == [
+        CardNameDoc,
+        VoornamenDoc,
+    ]
+    assert [doctype for _, doctype in add_documents.list_files(path, "VoornamenDoc")] == [
+        VoornamenDoc
+    ]
+
+
+class RecordingProcessor:
+    """Keep the documents instead of sending them to Elasticsearch."""
+
+    instances: list = []
+
+    def __init__(self, dryrun: bool):
+        self.registered: list = []
+        self.docs: list = []
+        self.finalized = False
+        self.instances.append(self)
+
+    def register_index(self, doctype):
+        self.registered.append(doctype)
+
+    def add_dict(self, d: dict):
+        self.docs.append(d)
+
+    def finalize(self):
+        self.finalized = True
+
+
+def test_run_with_workers(tmp_path, monkeypatch):
+    path = write_files(tmp_path)
+    monkeypatch.setattr(add_documents, "DocProcessor", RecordingProcessor)
+    monkeypatch.setattr(RecordingProcessor, "instances", [])
+    add_documents.run(path, doctype_name=None, dryrun=True, workers=1)
+    add_documents.run(path, doctype_name=None, dryrun=True, workers=2)
+    sequential, parallel = RecordingProcessor.instances
+    assert len(sequential.docs) == 4
+    assert parallel.docs == sequential.docs
+    assert parallel.registered == sequential.registered == [CardNameDoc, VoornamenDoc]
+    assert sequential.finalized and parallel.finalized
+
+
+class InlinePool:
+    """Run the tasks right away, and count how many results weren't taken yet."""
+
+    def __init__(self):
+        self.waiting = 0
+        self.most_waiting = 0
+
+    def apply_async(self, func, args):
+        result = func(*args)
+        self.waiting += 1
+        self.most_waiting = max(self.most_waiting, self.waiting)
+        return SimpleNamespace(get=self.take(result))
+
+    def take(self, result):
+        def get():
+            self.waiting -= 1
+            return result
+
+        return get
+
+
+def test_parse_files_in_pool_bounds_the_backlog(tmp_path):
+    path = write_files(tmp_path)
+    files = add_documents.list_files(path, None) * 3
+    pool = InlinePool()
+    results = list(add_documents.parse_files_in_pool(pool, files, ahead=2))
+    assert results == [add_documents.parse_file(file) for file in files]
+    assert pool.most_waiting == 2
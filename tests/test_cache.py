@@ -0,0 +1,107 @@
+import hashlib
+import json
+import stat
+import threading
+
+import pytest
+
+from collectiegroesbeek.cache import SingleFlight, TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=60, timer=timer)
+    cache.set("a", 1)
+    timer.now = 59
+    assert cache.get("a") == 1
+    timer.now = 61
+    assert cache.get("a") is None
+    assert cache.stats() == {"size": 0, "hits": 1, "misses": 1}
+
+
+def run_in_thread(flight: SingleFlight, key: str, function) -> list:
+    result: list = []
+    thread = threading.Thread(target=lambda: result.append(flight.do(key, function)))
+    thread.start()
+    return [thread, result]
+
+
+def test_single_flight_within_process():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def search():
+        calls.append(1)
+        release.wait()
+        return {"hits": 1}
+
+    leader = run_in_thread(flight, "q=jan", search)
+    while not calls:
+        pass
+    follower = run_in_thread(flight, "q=jan", search)
+    release.set()
+    for thread, _ in (leader, follower):
+        thread.join()
+    assert leader[1] == follower[1] == [{"hits": 1}]
+    assert len(calls) == 1
+    assert flight.stats() == {"led": 1, "shared": 1}
+
+
+def test_single_flight_between_processes(tmp_path):
+    # each instance stands in for a process, they only share the directory
+    path = str(tmp_path / "flight")
+    first, second = SingleFlight(path), SingleFlight(path)
+    release = threading.Event()
+    calls = []
+
+    def search():
+        calls.append(1)
+        release.wait()
+        return {"hits": 1}
+
+    leader = run_in_thread(first, "q=jan", search)
+    while not calls:
+        pass
+    follower = run_in_thread(second, "q=jan", lambda: {"hits": 2})
+    release.set()
+    for thread, _ in (leader, follower):
+        thread.join()
+    assert leader[1] == follower[1] == [{"hits": 1}]
+    assert second.stats() == {"led": 0, "shared": 1}
+    assert second.do("q=piet", lambda: {"hits": 3}) == {"hits": 3}
+
+
+def test_single_flight_only_trusts_its_own_files(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o755)
+    with pytest.raises(ValueError):
+        SingleFlight(str(shared))
+    path = tmp_path / "flight"
+    flight = SingleFlight(str(path))
+    assert stat.S_IMODE(path.stat().st_mode) == 0o700
+    # a result that wasn't written for the key is not used
+    name = hashlib.sha1(b"q=jan").hexdigest()
+    (path / f"{name}.json").write_text(json.dumps({"hits": "<script>"}))
+    assert flight.do("q=jan", lambda: {"hits": 1}) == {"hits": 1}
+    assert flight.stats() == {"led": 1, "shared": 0}
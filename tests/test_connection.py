@@ -0,0 +1,24 @@
+import time
+
+import pytest
+
+from collectiegroesbeek.connection import run_concurrently
+
+
+def test_run_concurrently():
+    def sleep_and_return(value):
+        time.sleep(0.1)
+        return value
+
+    start = time.monotonic()
+    results = run_concurrently(*[lambda i=i: sleep_and_return(i) for i in range(4)])
+    assert results == [0, 1, 2, 3]
+    assert time.monotonic() - start < 0.3
+
+
+def test_run_concurrently_raises():
+    def fail():
+        raise ValueError("kapot")
+
+    with pytest.raises(ValueError):
+        run_concurrently(lambda: 1, fail)
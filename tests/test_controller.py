@@ -1,8 +1,26 @@
+import base64
+import re
+
 import pytest
+from elasticsearch import NotFoundError, RequestError
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.connections import connections
 from elasticsearch_dsl.query import Q
 
-from collectiegroesbeek.controller import Searcher
-from collectiegroesbeek.model import list_doctypes
+from collectiegroesbeek import app, controller
+from collectiegroesbeek.cache import data_generation
+from collectiegroesbeek.controller import (
+    InvalidCursorError,
+    Searcher,
+    compile_query,
+    decode_cursor,
+    encode_cursor,
+    get_suggestions,
+    iter_hit_batches,
+    search_after_page,
+)
+from collectiegroesbeek.model import CardNameDoc, list_doctypes
+from collectiegroesbeek.vocabulary import Vocabulary, vocabulary_file
 
 
 @pytest.mark.parametrize(
@@ -56,3 +74,246 @@ def test_handle_specific_field_request(
     assert queries == expected_queries
     assert sorted(keywords) == sorted(expected_keywords)
     assert q_stripped == expected_q_stripped
+
+
+@pytest.mark.parametrize(
+    "query, expected_queries, expected_keywords, expected_words",
+    [
+        # Single field with single value
+        ("naam:value", [Q("match", naam={"query": "value", "operator": "and"})], ["value"], ""),
+        # Single field with multi-word value
+        (
+            'naam:"multi word value"',
+            [Q("match", naam={"query": "multi word value", "operator": "and"})],
+            ["multi", "word", "value"],
+            "",
+        ),
+        # Multiple fields with single and multi-word values
+        (
+            'naam:single datum:"multi word value"',
+            [
+                Q("match", naam={"query": "single", "operator": "and"}),
+                Q("match", datum={"query": "multi word value", "operator": "and"}),
+            ],
+            ["single", "multi", "word", "value"],
+            "",
+        ),
+        # Mixed query with normal search terms
+        (
+            "normal search naam:value another",
+            [Q("match", naam={"query": "value", "operator": "and"})],
+            ["normal", "search", "value", "another"],
+            "normal search another",
+        ),
+        # No field specified
+        ("normal search", [], ["normal", "search"], "normal search"),
+        # Case where colon appears as part of a value for a field
+        (
+            'naam:"value:with:colons"',
+            [Q("match", naam={"query": "value:with:colons", "operator": "and"})],
+            ["value:with:colons"],
+            "",
+        ),
+        # Case where colon appears as part of a value without field
+        ("value:with:colons", [], ["value:with:colons"], "value:with:colons"),
+    ],
+)
+def test_compile_query_field_terms(query, expected_queries, expected_keywords, expected_words):
+    compiled = compile_query(query, tuple(list_doctypes()))
+    clauses = compiled.plan.clauses
+    words = [clause.query.query for clause in clauses if clause.reason == "keywords"]
+
+    assert [clause.query for clause in clauses if clause.reason == "field term"] == expected_queries
+    assert not any(clause.filter for clause in clauses if clause.reason == "field term")
+    assert sorted(compiled.keywords) == sorted(expected_keywords)
+    assert " ".join(words) == expected_words
+
+
+def test_get_suggestions(monkeypatch):
+    vocabulary = Vocabulary({"janssen": 10, "jansz": 3, "jansen": 5, "leiden": 8})
+    monkeypatch.setattr(vocabulary_file, "get", lambda: vocabulary)
+    assert get_suggestions(["jansen", "1650", "van"]) == {"jansen": ["janssen", "jansz"]}
+
+
+def test_highlight_only_queried_fields():
+    searcher = Searcher(q="naam:jan", start=0, size=10, doctypes=[CardNameDoc])
+    assert list(searcher.s.to_dict()["highlight"]["fields"]) == ["naam"]
+    searcher = Searcher(q="leiden", start=0, size=10, doctypes=[CardNameDoc])
+    fields = ["bron", "datum", "getuigen", "inhoud", "naam"]
+    assert list(searcher.s.to_dict()["highlight"]["fields"]) == fields
+    searcher = Searcher(q="1500-1600", start=0, size=10, doctypes=[CardNameDoc])
+    assert "highlight" not in searcher.s.to_dict()
+
+
+def test_query_plan_filters_dates():
+    searcher = Searcher(
+        q='naam:altena leiden "heer van" 1650-03-12 1500-1600',
+        start=0,
+        size=10,
+        doctypes=[CardNameDoc],
+    )
+    plan = [(clause["context"], clause["reason"]) for clause in searcher.plan.explain()]
+    assert plan == [
+        ("must", "field term"),
+        ("must", "phrase"),
+        ("filter", "date"),
+        ("must", "keywords"),
+        ("filter", "year range"),
+    ]
+    query = searcher.s.to_dict()["query"]["bool"]
+    assert len(query["must"]) == 3
+    assert len(query["filter"]) == 2
+
+
+def test_compile_query_only_field_terms_scores():
+    compiled = compile_query("naam:jansen bron:leiden", (CardNameDoc,))
+    assert compiled.query.to_dict() == {
+        "bool": {
+            "must": [
+                {"match": {"naam": {"query": "jansen", "operator": "and"}}},
+                {"match": {"bron": {"query": "leiden", "operator": "and"}}},
+            ]
+        }
+    }
+
+
+class FakePointInTimeClient:
+    """Search 25 hits sorted by their number, in points in time that must be opened first."""
+
+    def __init__(self):
+        self.open = set()
+        self.opened = 0
+
+    def open_point_in_time(self, index, keep_alive):
+        self.opened += 1
+        pit_id = f"pit{self.opened}"
+        self.open.add(pit_id)
+        return {"id": pit_id}
+
+    def close_point_in_time(self, body, ignore):
+        self.open.discard(body["id"])
+
+    def search(self, index=None, **body):
+        pit_id = body.get("pit", {}).get("id")
+        if pit_id is not None and pit_id not in self.open:
+            raise NotFoundError(404, "search_context_missing_exception", {})
+        after = body.get("search_after")
+        if after is not None and not (len(after) == 1 and isinstance(after[0], int)):
+            raise RequestError(400, "parse_exception", {})
+        numbers = [n for n in range(25) if after is None or n > after[0]]
+        start = body.get("from_", 0)
+        hits = [
+            {"_index": "achternamen_1", "_id": str(n), "_source": {}, "sort": [n]}
+            for n in numbers[start : start + body.get("size", 10)]
+        ]
+        return {"pit_id": pit_id, "hits": {"total": {"value": 25, "relation": "eq"}, "hits": hits}}
+
+
+@pytest.fixture
+def es_client(monkeypatch) -> FakePointInTimeClient:
+    client = FakePointInTimeClient()
+    monkeypatch.setattr(connections, "_conns", {"default": client})
+    return client
+
+
+def get_ids(resp) -> list:
+    return [int(hit.meta.id) for hit in resp.hits]
+
+
+def test_search_after_page(es_client):
+    s = Search(index="achternamen").sort("jaar")
+    resp, cursor = search_after_page(s, "", size=10, start=10)
+    assert get_ids(resp) == list(range(10, 20))
+    assert cursor is not None
+    assert decode_cursor(cursor) == ("pit1", [19])
+    assert es_client.open == {"pit1"}
+    # the last page closes the point in time
+    resp, cursor = search_after_page(s, cursor, size=10)
+    assert get_ids(resp) == list(range(20, 25))
+    assert cursor is None
+    assert es_client.open == set()
+    # as does a result that fits on one page
+    resp, cursor = search_after_page(s, "", size=30)
+    assert len(resp.hits) == 25
+    assert cursor is None
+    assert es_client.open == set()
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor!",
+        base64.urlsafe_b64encode(b"[1, 2]").decode(),
+        base64.urlsafe_b64encode(b'{"pit": 1, "after": null}').decode(),
+        # sort values that don't fit the sort
+        encode_cursor("pit1", ["x", 1]),
+        # an expired point in time
+        encode_cursor("pit9", [3]),
+    ],
+)
+def test_search_after_page_invalid_cursor(es_client, cursor):
+    es_client.open_point_in_time(index="achternamen", keep_alive="1m")
+    with pytest.raises(InvalidCursorError):
+        search_after_page(Search(index="achternamen"), cursor, size=10)
+
+
+def test_iter_hit_batches(es_client):
+    batches = list(iter_hit_batches(Search(index="achternamen"), batch_size=10))
+    assert [len(hits) for hits in batches] == [10, 10, 5]
+    assert es_client.opened == 1
+    assert es_client.open == set()
+
+
+def test_api_rows_with_cursor(es_client):
+    client = app.test_client()
+    columns = [{"data": column, "search": {"value": ""}} for column in CardNameDoc.get_columns()]
+    request = {"index": "achternamen", "columns": columns, "order": [], "length": 10, "draw": 1}
+
+    def get_rows(**kwargs) -> dict:
+        resp = client.post("/api/rows/", json={**request, **kwargs})
+        assert resp.status_code == 200
+        return resp.get_json()
+
+    # the first page doesn't open a point in time, the second does
+    assert get_rows(start=0)["cursor"] is None
+    assert es_client.opened == 0
+    rows = get_rows(start=10, cursor="")
+    assert [row["id"] for row in rows["data"]] == [str(n) for n in range(10, 20)]
+    rows = get_rows(start=20, cursor=rows["cursor"])
+    assert [row["id"] for row in rows["data"]] == [str(n) for n in range(20, 25)]
+    assert rows["cursor"] is None
+    assert es_client.open == set()
+    for cursor in ["not a cursor!", encode_cursor("pit1", ["x"]), 12]:
+        resp = client.post("/api/rows/", json={**request, "start": 10, "cursor": cursor})
+        assert resp.status_code == 400
+
+
+def test_search_pages_with_cursor_past_result_window(es_client, monkeypatch):
+    monkeypatch.setattr(data_generation, "get_alias_to_index", lambda: {})
+    monkeypatch.setattr(controller, "get_suggestions", lambda keywords: {})
+    monkeypatch.setattr(controller, "MAX_RESULT_WINDOW", 20)
+    client = app.test_client()
+    # pages within the result window use from/size, without a point in time
+    resp = client.get("/zoek/?q=jan")
+    assert resp.status_code == 200
+    assert es_client.opened == 0
+    assert b'href="/zoek/?q=jan&amp;page=2"' in resp.data
+    # the last one continues with a cursor, and keeps the page numbers
+    resp = client.get("/zoek/?q=jan&page=2")
+    assert resp.status_code == 200
+    assert es_client.opened == 1
+    assert b'href="/zoek/?q=jan"' in resp.data
+    match = re.search(rb'href="/zoek/\?q=jan&amp;page=3&amp;cursor=([\w=-]+)"', resp.data)
+    assert match is not None
+    resp = client.get(f"/zoek/?q=jan&page=3&cursor={match.group(1).decode()}")
+    assert resp.status_code == 200
+    assert b'href="/zoek/?q=jan&amp;page=2"' in resp.data
+    assert es_client.open == set()
+    # an expired cursor shows the page with from/size, or the last one that can be
+    cursor = encode_cursor("pit9", [3])
+    assert client.get(f"/zoek/?q=jan&page=2&cursor={cursor}").status_code == 200
+    resp = client.get(f"/zoek/?q=jan&page=3&cursor={cursor}")
+    assert resp.status_code == 302
+    assert resp.headers["Location"] == "/zoek/?q=jan&page=2"
+    # as does a page past it without a cursor
+    assert client.get("/zoek/?q=jan&page=9").headers["Location"] == "/zoek/?q=jan&page=2"
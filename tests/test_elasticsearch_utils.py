@@ -0,0 +1,204 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from elasticsearch.helpers import BulkIndexError
+from elasticsearch.serializer import JSONSerializer
+from elasticsearch_dsl import Index
+from elasticsearch_dsl.connections import connections
+
+from collectiegroesbeek.model import BronDoc, CardNameDoc
+from ingest.elasticsearch_utils import (
+    DocProcessor,
+    IndexMover,
+    find_built_indices,
+    find_leftover_indices,
+    swap_aliases,
+)
+from ingest.warmup import Warmer
+
+
+class FakeIndices:
+    def __init__(self, indices=None):
+        self.calls = []
+        # index name to its aliases and the _meta of its mapping
+        self.indices = indices or {}
+
+    def update_aliases(self, body):
+        self.calls.append(("update_aliases", body["actions"]))
+
+    def delete(self, index, ignore_unavailable):
+        self.calls.append(("delete", index))
+
+    def get_alias(self, index, ignore_unavailable):
+        return {
+            name: {"aliases": {alias: {} for alias in aliases}}
+            for name, (aliases, _) in self.indices.items()
+            if name.startswith(index.rstrip("*"))
+        }
+
+    def get_mapping(self, index, ignore_unavailable):
+        return {
+            name: {"mappings": {"_meta": meta}}
+            for name, (_, meta) in self.indices.items()
+            if name.startswith(index.rstrip("*"))
+        }
+
+    def put_mapping(self, index, body):
+        self.indices[index][1].update(body["_meta"])
+
+    def refresh(self, index):
+        self.calls.append(("refresh", index))
+
+
+class FakeClient:
+    def __init__(self):
+        self.indices = FakeIndices()
+
+
+def make_mover(doctype, old_name, new_name) -> IndexMover:
+    mover = IndexMover.__new__(IndexMover)
+    mover.doctype, mover.warmer, mover.alias = doctype, None, doctype.Index.name
+    mover.old_name, mover.new_name = old_name, new_name
+    mover.new_es_index = Index(new_name)
+    return mover
+
+
+def test_swap_aliases(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(connections, "_conns", {"default": client})
+    movers = [
+        make_mover(CardNameDoc, "achternamen_1600000000", "achternamen_1700000000"),
+        make_mover(BronDoc, None, "bronnen_1700000000"),
+    ]
+    thread = swap_aliases(movers, retire_delay=0)
+    assert thread is not None
+    thread.join()
+    assert client.indices.calls == [
+        (
+            "update_aliases",
+            [
+                {"remove": {"index": "achternamen_1600000000", "alias": "achternamen"}},
+                {"add": {"index": "achternamen_1700000000", "alias": "achternamen"}},
+                {"add": {"index": "bronnen_1700000000", "alias": "bronnen"}},
+            ],
+        ),
+        ("delete", "achternamen_1600000000"),
+    ]
+
+
+class FailingWarmer(Warmer):
+    def __init__(self):
+        self.stages = []
+
+    def warm_up(self, doctype, index, stage):
+        self.stages.append(stage)
+        raise ConnectionError("warm-up failed")
+
+
+def test_swap_aliases_despite_failing_warm_up(monkeypatch, caplog):
+    client = FakeClient()
+    monkeypatch.setattr(connections, "_conns", {"default": client})
+    mover = make_mover(CardNameDoc, "achternamen_1600000000", "achternamen_1700000000")
+    warmer = FailingWarmer()
+    mover.warmer = warmer
+    thread = swap_aliases([mover], retire_delay=0)
+    assert thread is not None
+    thread.join()
+    assert warmer.stages == ["before swap", "after swap"]
+    assert [call[0] for call in client.indices.calls] == ["refresh", "update_aliases", "delete"]
+    assert "Warm-up after swap achternamen_1700000000 failed" in caplog.text
+
+
+class FakeBulkClient:
+    """Index every document, except that some are rejected once with 429 or fail for good."""
+
+    def __init__(self, reject_once=(), fail=()):
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+        self.reject_once = set(reject_once)
+        self.fail = set(fail)
+        self.indices = FakeIndices({"achternamen_1700000000": (set(), {})})
+        self.bodies = []
+        self.ids = []
+
+    def bulk(self, body, request_timeout):
+        self.bodies.append(body)
+        actions = [json.loads(line) for line in body.decode().splitlines()[::2]]
+        items = []
+        for action in actions:
+            doc_id = action["index"]["_id"]
+            self.ids.append(doc_id)
+            status = 201
+            if doc_id in self.reject_once:
+                self.reject_once.remove(doc_id)
+                status = 429
+            elif doc_id in self.fail:
+                status = 400
+            items.append(
+                {"index": {"_index": "achternamen_1700000000", "_id": doc_id, "status": status}}
+            )
+        return {"errors": any(item["index"]["status"] != 201 for item in items), "items": items}
+
+
+def make_processor(monkeypatch, client, **kwargs) -> DocProcessor:
+    monkeypatch.setattr(connections, "_conns", {"default": client})
+    processor = DocProcessor(warm_up=False, defer_swap=True, **kwargs)
+    processor.initial_backoff = 0
+    processor._movers = {"achternamen": make_mover(CardNameDoc, None, "achternamen_1700000000")}
+    return processor
+
+
+def add_docs(processor: DocProcessor, n: int):
+    for i in range(n):
+        processor.add_dict({"_index": "achternamen", "_id": str(i), "_source": {"naam": "x" * 100}})
+
+
+def test_doc_processor_batches_by_bytes(monkeypatch):
+    client = FakeBulkClient()
+    processor = make_processor(monkeypatch, client, max_batch_bytes=1000)
+    add_docs(processor, 20)
+    processor.flush()
+    processor._wait_for_batches()
+    assert len(client.bodies) > 1
+    assert all(len(body) <= 1000 for body in client.bodies)
+    assert sorted(client.ids, key=int) == [str(i) for i in range(20)]
+    assert processor._count == 20
+
+
+def test_doc_processor_retries_rejected_and_reports_failed(monkeypatch):
+    client = FakeBulkClient(reject_once={"3", "7"}, fail={"5"})
+    processor = make_processor(monkeypatch, client, batch_size=4)
+    add_docs(processor, 10)
+    with pytest.raises(BulkIndexError) as e:
+        processor.finalize()
+    assert [error["id"] for error in e.value.errors] == ["5"]
+    assert client.ids.count("3") == 2
+    assert client.ids.count("7") == 2
+    assert processor._count == 9
+
+
+def test_doc_processor_marks_finished_indices(monkeypatch):
+    client = FakeBulkClient()
+    processor = make_processor(monkeypatch, client)
+    add_docs(processor, 3)
+    assert processor.finalize() is None
+    assert "build_finished" in client.indices.indices["achternamen_1700000000"][1]
+    assert client.indices.calls == [("refresh", "achternamen_1700000000")]
+
+
+def test_find_built_and_leftover_indices(monkeypatch):
+    client = FakeClient()
+    client.indices.indices = {
+        "achternamen_1600000000": ({"achternamen"}, {}),
+        "achternamen_1700000000": (set(), {"build_finished": 1700001000}),
+        # a failed run
+        "achternamen_1800000000": (set(), {}),
+        "bronnen_1700000000": (set(), {}),
+    }
+    monkeypatch.setattr(connections, "_conns", {"default": client})
+    built = find_built_indices([CardNameDoc, BronDoc])
+    assert built == {CardNameDoc: "achternamen_1700000000"}
+    assert find_leftover_indices([CardNameDoc, BronDoc], keep=built.values()) == [
+        "achternamen_1800000000",
+        "bronnen_1700000000",
+    ]
@@ -0,0 +1,60 @@
+from collectiegroesbeek import controller
+from collectiegroesbeek.export import get_export_columns, iter_csv, iter_jsonl
+from collectiegroesbeek.model import list_doctypes
+
+HITS = [
+    {"_index": "voornamen_1700000000", "_id": "1", "_source": {"naam": "Jan", "jaar": 1650}},
+    {"_index": "voornamen_1700000000", "_id": "2", "_source": {"naam": "Piet, zoon van Jan"}},
+]
+
+
+def test_get_export_columns():
+    doctypes = list_doctypes()[:2]
+    columns = get_export_columns(doctypes)
+    assert columns[:2] == ["index", "id"]
+    assert len(columns) == len(set(columns))
+    assert set(doctypes[0].get_columns()) | set(doctypes[1].get_columns()) == set(columns[2:])
+
+
+def test_iter_csv():
+    chunks = list(iter_csv([HITS[:1], HITS[1:]], ["index", "id", "naam", "jaar"]))
+    assert "".join(chunks).splitlines() == [
+        "index,id,naam,jaar",
+        "voornamen,1,Jan,1650",
+        'voornamen,2,"Piet, zoon van Jan",',
+    ]
+
+
+def test_iter_jsonl():
+    lines = "".join(iter_jsonl([HITS])).splitlines()
+    assert lines[0] == '{"index": "voornamen", "id": "1", "naam": "Jan", "jaar": 1650}'
+    assert len(lines) == 2
+
+
+class FakeResponse(dict):
+    def to_dict(self) -> dict:
+        return self
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = []
+
+    def close_point_in_time(self, body, ignore):
+        self.closed.append(body["id"])
+
+
+def test_iter_hit_batches_closes_point_in_time(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(controller, "get_client", lambda: client)
+    monkeypatch.setattr(
+        controller,
+        "search_after_page",
+        lambda s, cursor, size: (FakeResponse(pit_id="pit", hits={"hits": HITS}), "next"),
+    )
+    batches = controller.iter_hit_batches(None, batch_size=2)
+    assert next(batches) == HITS
+    assert client.closed == []
+    # like a cancelled download, the generator is closed before the last page
+    batches.close()
+    assert client.closed == ["pit"]
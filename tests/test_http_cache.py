@@ -0,0 +1,92 @@
+import flask
+
+from collectiegroesbeek import app, controller, http_cache
+from collectiegroesbeek.cache import data_generation
+from collectiegroesbeek.http_cache import (
+    Validators,
+    canonical_search_args,
+    conditional,
+    get_index_timestamp,
+)
+from collectiegroesbeek.model import list_doctypes
+from collectiegroesbeek.routes import views
+
+
+def test_get_index_timestamp():
+    assert get_index_timestamp("bronnen", "bronnen_1700000000") == 1700000000.0
+    assert get_index_timestamp("bronnen", "bronnen") is None
+    assert get_index_timestamp("namen", "namen-ner_1700000000") is None
+
+
+def test_conditional():
+    app = flask.Flask(__name__)
+    calls = []
+
+    @app.route("/")
+    @conditional(lambda: Validators(etag="abc", last_modified=None), max_age=30)
+    def view():
+        calls.append(1)
+        return "hallo"
+
+    client = app.test_client()
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"abc"'
+    assert response.headers["Cache-Control"] == "public, max-age=30"
+    response = client.get("/", headers={"If-None-Match": '"abc"'})
+    assert response.status_code == 304
+    assert len(calls) == 1
+    assert client.get("/", headers={"If-None-Match": '"xyz"'}).status_code == 200
+
+
+def test_canonical_search_args():
+    assert canonical_search_args("  Jan   de Wit ", []) == [("q", "jan de wit")]
+    assert canonical_search_args("leiden", ["voornamen", "achternamen", "onbekend"], page=2) == [
+        ("q", "leiden"),
+        ("index", "achternamen"),
+        ("index", "voornamen"),
+        ("page", "2"),
+    ]
+    all_index_names = [doctype.Index.name for doctype in list_doctypes()]
+    assert canonical_search_args("leiden", all_index_names, sort_by="") == [("q", "leiden")]
+    assert canonical_search_args("", [], sort_by="jaar", page=1, cursor="abc") == [
+        ("q", ""),
+        ("sort", "jaar"),
+        ("cursor", "abc"),
+    ]
+    # an empty cursor is the same page without one
+    assert canonical_search_args("leiden", [], page=2, cursor="") == [
+        ("q", "leiden"),
+        ("page", "2"),
+    ]
+
+
+def test_last_modified_includes_code_version(monkeypatch):
+    monkeypatch.setattr(http_cache, "CODE_MTIME", 1_800_000_000)
+    validators = http_cache._make_validators(parts=["bronnen_1700000000"], timestamps=[1.7e9])
+    assert validators.last_modified is not None
+    assert validators.last_modified.timestamp() == 1_800_000_000
+
+
+def test_search_redirects_to_canonical_url(monkeypatch):
+    monkeypatch.setattr(data_generation, "get_alias_to_index", lambda: {})
+    response = app.test_client().get("/zoek/?q=Jan++de+Wit&sort=")
+    assert response.status_code == 302
+    assert response.headers["Location"] == "/zoek/?q=jan%20de%20wit"
+    assert "Cache-Control" not in response.headers
+    response = app.test_client().get("/zoek/?q=jan&page=2&cursor=")
+    assert response.headers["Location"] == "/zoek/?q=jan&page=2"
+
+
+def test_locations_link_to_canonical_search_urls(monkeypatch):
+    monkeypatch.setattr(data_generation, "get_alias_to_index", lambda: {})
+    rows = [
+        controller.LocationRow(location="Grote Markt", variants=(("Grote Markt", 3),)),
+        controller.LocationRow(location="Spaarne", variants=(("Spaarne", 2), ("Sparen", 1))),
+    ]
+    monkeypatch.setattr(views, "locations_search", lambda query, page, per_page: (rows, 2))
+    response = app.test_client().get("/locaties/")
+    assert response.status_code == 200
+    index = "&amp;index=transportregister-haarlem"
+    assert f'href="/zoek/?q=inhoud%3A%22grote%20markt%22{index}"'.encode() in response.data
+    assert f'href="/zoek/?q=inhoud%3A%22sparen%22{index}"'.encode() in response.data
@@ -1,4 +1,12 @@
-from collectiegroesbeek.model import create_year
+from collectiegroesbeek.model import (
+    CardNameDoc,
+    VoornamenDoc,
+    create_year,
+    get_doctype_from_index,
+    get_doctype_info,
+    get_hit_view_class,
+    get_selection_info,
+)
 
 
 class TestCardNameIndex:
@@ -9,3 +17,36 @@ class TestCardNameIndex:
         assert create_year("1513-04-01") == 1513
         assert create_year("1513-4-1") == 1513
         assert create_year("1316-11-21 en 1317-04-21") == 1316
+
+
+def test_doctype_info():
+    info = get_doctype_info(CardNameDoc)
+    assert info.columns == ("datum", "naam", "inhoud", "bron", "getuigen", "bijzonderheden")
+    assert info.sort_fields["naam"] == "naam.keyword"
+    assert info.sort_fields["jaar"] == "jaar"
+    assert CardNameDoc.get_columns() == list(info.columns)
+
+
+def test_selection_info():
+    selection = get_selection_info((CardNameDoc, VoornamenDoc))
+    assert selection.index_names == ("achternamen", "voornamen")
+    assert selection.multimatch_fields.count("datum^3") == 1
+    assert get_selection_info((CardNameDoc, VoornamenDoc)) is selection
+    assert {"naam", "voornaam", "patroniem"} <= selection.field_names
+
+
+def test_hit_view():
+    hit: dict = {
+        "_index": "voornamen_1700000000",
+        "_id": "12",
+        "_score": 2.5,
+        "_source": {"voornaam": "Jan", "patroniem": "Pietersz", "datum": "1513", "bron": "Leiden"},
+        "highlight": {"voornaam": ["<em>Jan</em>"], "voornaam.keyword": ["<em>Jan</em>"]},
+    }
+    assert get_doctype_from_index(hit["_index"]) is VoornamenDoc
+    view = get_hit_view_class(VoornamenDoc).from_hit(hit)
+    doc = VoornamenDoc.from_es({**hit, "_source": {**hit["_source"], "voornaam": "<em>Jan</em>"}})
+    assert view.get_title() == doc.get_title() == "<em>Jan</em> Pietersz | 1513"
+    assert view.get_subtitle() == doc.get_subtitle()
+    assert view.get_body_lines() == doc.get_body_lines() == []
+    assert (view.id, view.score, view.index_name) == ("12", 2.5, "voornamen")
@@ -0,0 +1,47 @@
+from collectiegroesbeek.prefix_index import PrefixIndex, RowIndex
+
+
+def test_prefix_index_matches_all_query_words():
+    index = PrefixIndex(["Jan Pietersz", "Pieter Jansz", "Jacob Claesz", "Claes Jansz"])
+    assert index.search("jan", page=1, per_page=10) == (
+        ["Claes Jansz", "Jan Pietersz", "Pieter Jansz"],
+        3,
+    )
+    assert index.search("jans cl", page=1, per_page=10) == (["Claes Jansz"], 1)
+    assert index.search("jansz x", page=1, per_page=10) == ([], 0)
+
+
+def test_prefix_index_pages():
+    index = PrefixIndex(["a", "b", "c", "d", "e"])
+    assert index.search("", page=2, per_page=2) == (["c", "d"], 5)
+    assert index.search("", page=3, per_page=2) == (["e"], 5)
+    # a page before the first doesn't slice from the end
+    assert index.search("", page=-1, per_page=2) == (["a", "b"], 5)
+    assert index.search("", page=0, per_page=2) == (["a", "b"], 5)
+
+
+def test_prefix_index_with_counts():
+    counts = {"Arch Culemborg": 3, "Arch Nassau": 10, "Stadsrek Leiden": 5}
+    index = PrefixIndex(counts, counts=counts)
+    assert index.search_with_counts("arch", page=1, per_page=10) == (
+        [("Arch Culemborg", 3), ("Arch Nassau", 10)],
+        2,
+    )
+    assert index.search_with_counts("", page=1, per_page=2, sort_by_count=True) == (
+        [("Arch Nassau", 10), ("Stadsrek Leiden", 5)],
+        3,
+    )
+    assert index.search_with_counts("a", page=1, per_page=10, sort_by_count=True)[0] == [
+        ("Arch Nassau", 10),
+        ("Arch Culemborg", 3),
+    ]
+
+
+def test_row_index():
+    index = RowIndex([(1, "Leiden Leyden"), (2, "Haarlem"), (3, "Leiderdorp")])
+    assert index.search("", page=1, per_page=2) == ([1, 2], 3)
+    assert index.search("lei", page=1, per_page=10) == ([1, 3], 2)
+    assert index.search("lei", page=2, per_page=1) == ([3], 2)
+    assert index.search("lei yde", page=1, per_page=10) == ([1], 1)
+    assert index.search("utrecht", page=1, per_page=10) == ([], 0)
+    assert index.search("lei", page=-1, per_page=1) == ([1], 2)
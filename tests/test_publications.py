@@ -0,0 +1,42 @@
+import json
+import os
+
+from collectiegroesbeek.publications import PublicationCatalogue
+
+
+def write_publication(path, name: str, jaar: int, categorie: str):
+    (path / f"{name}.html").write_text("<p>tekst</p>")
+    metadata = {
+        "titel": name.title(),
+        "jaar": jaar,
+        "afkomstig uit": "archief",
+        "omschrijving": "",
+        "categorie": categorie,
+    }
+    (path / f"{name}.json").write_text(json.dumps(metadata))
+
+
+def test_publication_catalogue(tmp_path):
+    write_publication(tmp_path, "tweede", 1990, "boek")
+    write_publication(tmp_path, "eerste", 1980, "artikel")
+    now = [0.0]
+    catalogue = PublicationCatalogue(str(tmp_path), check_interval=10, timer=lambda: now[0])
+
+    result = catalogue.get()
+    assert [p.publicatie for p in result.publications] == ["eerste", "tweede"]
+    assert result.categories == ("artikel", "boek")
+    assert result.by_name["tweede"].metadata["afkomstig uit"] == "archief"
+
+    write_publication(tmp_path, "derde", 1970, "boek")
+    assert catalogue.get() is result
+    now[0] = 11.0
+    result = catalogue.get()
+    assert [p.publicatie for p in result.publications] == ["derde", "eerste", "tweede"]
+
+    os.utime(tmp_path / "derde.json", ns=(0, 0))
+    now[0] = 22.0
+    assert catalogue.get() is not result
+    now[0] = 33.0
+    result = catalogue.get()
+    now[0] = 44.0
+    assert catalogue.get() is result
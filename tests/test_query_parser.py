@@ -0,0 +1,34 @@
+from collectiegroesbeek.controller import compile_query
+from collectiegroesbeek.model import CardNameDoc
+from collectiegroesbeek.query_parser import (
+    DateTerm,
+    FieldTerm,
+    Phrase,
+    Term,
+    YearRange,
+    parse_query,
+)
+
+
+def test_parse_query():
+    parsed = parse_query('naam:altena leiden "heer van" 1650-03-12 1500-1600', {"naam"})
+    assert parsed.groups == (
+        (FieldTerm("naam", "altena"), Term("leiden"), Phrase("heer van"), DateTerm("1650-03-12")),
+    )
+    assert parsed.year_range == YearRange(1500, 1600)
+
+
+def test_parse_query_groups_and_unknown_fields():
+    parsed = parse_query('jan & naam:"van der" & foo:bar & ""', {"naam"})
+    assert parsed.groups == (
+        (Term("jan"),),
+        (FieldTerm("naam", "van der"),),
+        (Term("foo:bar"),),
+    )
+    assert parsed.year_range is None
+
+
+def test_compile_query_is_cached():
+    compiled = compile_query("leiden naam:jan", (CardNameDoc,))
+    assert compile_query("leiden naam:jan", (CardNameDoc,)) is compiled
+    assert compiled.keywords == {"jan", "leiden"}
@@ -0,0 +1,44 @@
+import os
+
+from collectiegroesbeek.vocabulary import Vocabulary, VocabularyFile, count_words, edit_distance
+
+
+def test_count_words():
+    assert count_words(["Jan Pietersz, jan", "1650-03-12 pietersz."]) == {"jan": 2, "pietersz": 2}
+
+
+def test_edit_distance():
+    assert edit_distance("leiden", "leyden", 2) == 1
+    assert edit_distance("leiden", "lieden", 2) == 1
+    assert edit_distance("leiden", "leidse", 2) == 2
+    assert edit_distance("leiden", "haarlem", 2) == 3
+
+
+def test_vocabulary_lookup():
+    vocabulary = Vocabulary(
+        {"leiden": 50, "leyden": 5, "heiden": 2, "haarlem": 40, "pietersz": 9, "pieterszoon": 3}
+    )
+    assert vocabulary.lookup("leydne") == [("leyden", 1, 5), ("leiden", 2, 50)]
+    assert vocabulary.suggest("leiden") == ["leyden", "heiden"]
+    # only the first letters are indexed, the distance is over the whole word
+    assert vocabulary.suggest("pietesz") == ["pietersz"]
+    assert vocabulary.suggest("xyz") == []
+
+
+def test_vocabulary_file(tmp_path):
+    path = str(tmp_path / "vocabulary.pickle")
+    now = [0.0]
+    vocabulary_file = VocabularyFile(path, check_interval=10, timer=lambda: now[0])
+    assert vocabulary_file.get() is None
+
+    Vocabulary.from_word_counts({"leiden": 5, "leyden": 1, "de": 9}).save(path)
+    assert vocabulary_file.get() is None
+    now[0] = 11
+    vocabulary = vocabulary_file.get()
+    assert vocabulary is not None and vocabulary.words == ["leiden"]
+
+    Vocabulary({"haarlem": 1}).save(path)
+    os.utime(path, ns=(0, 0))
+    now[0] = 22
+    vocabulary = vocabulary_file.get()
+    assert vocabulary is not None and vocabulary.suggest("harlem") == ["haarlem"]
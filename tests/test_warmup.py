@@ -0,0 +1,52 @@
+from elasticsearch import ConnectionError
+from elasticsearch_dsl.connections import connections
+
+from collectiegroesbeek.model import BronDoc, CardNameDoc
+from ingest.warmup import Warmer, get_warmup_searches, load_warmup_queries
+
+
+def test_load_warmup_queries(tmp_path):
+    path = tmp_path / "queries.txt"
+    path.write_text("# top queries\njan\n\nnaam:jansz\n")
+    assert load_warmup_queries(str(path)) == ["jan", "naam:jansz"]
+    assert load_warmup_queries()
+
+
+def test_get_warmup_searches():
+    searches = get_warmup_searches(CardNameDoc, ["jan", "haarlem"])
+    assert len(searches["counts"]) == 1
+    assert len(searches["queries"]) == 2
+    assert len(searches["browse"]) == 2 * len(CardNameDoc.get_columns())
+    search = searches["queries"][0].index().index("voornamen_1700000000")
+    assert search._index == ["voornamen_1700000000"]
+    assert "highlight" in search.to_dict()
+    # derived indices are only counted
+    searches = get_warmup_searches(BronDoc, ["jan"])
+    assert searches == {"counts": searches["counts"], "queries": [], "browse": []}
+
+
+class FailingClient:
+    """Fail the document counts and every other search."""
+
+    def __init__(self):
+        self.searches = 0
+        self.cat = self
+
+    def indices(self, index, format):
+        raise ConnectionError("N/A", "unreachable", None)
+
+    def search(self, index=None, **body):
+        self.searches += 1
+        raise ConnectionError("N/A", "unreachable", None)
+
+
+def test_warm_up_skips_failing_searches(monkeypatch, caplog):
+    client = FailingClient()
+    monkeypatch.setattr(connections, "_conns", {"default": client})
+    timings = Warmer(queries=["jan", "haarlem"]).warm_up(
+        CardNameDoc, "achternamen_1700000000", stage="before swap"
+    )
+    assert set(timings) == {"counts", "queries", "browse", "total"}
+    assert client.searches == 1 + 2 + 2 * len(CardNameDoc.get_columns())
+    assert "the document counts failed" in caplog.text
+    assert "a queries search failed" in caplog.text
@@ -1,14 +1,20 @@
 import argparse
 
 from dotenv import dotenv_values
-from elasticsearch_dsl.connections import connections
 
 from collectiegroesbeek import app
+from collectiegroesbeek.cache import data_generation
+from collectiegroesbeek.connection import setup_connection
+from collectiegroesbeek.controller import setup_search_flight
+from collectiegroesbeek.vocabulary import setup_vocabulary
 
 _config = dotenv_values(".env")
 app.config["elasticsearch_host"] = _config["elasticsearch_host"]
 
-connections.create_connection("default", hosts=[app.config["elasticsearch_host"]])
+setup_connection(_config)
+setup_vocabulary(_config)
+setup_search_flight(_config)
+data_generation.start_background_refresh()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()